@@ -1,6 +1,5 @@
 from __future__ import annotations
 from typing import Optional, Any, Hashable, Sequence, Iterable, NamedTuple, List, Tuple
-from copy import deepcopy
 from gamesearch_problem import StateNode, Action
 
 
@@ -54,8 +53,17 @@ class ConnectFourGameState(StateNode):
     symbol_to_num = {"_": EMPTY, "X": 0, "0": 1}
 
 
+    # Bitboards: cell (r, c) is bit c * col_bits + (num_rows - 1 - r), so each column is a run of bits from the bottom up,
+    # topped by an always-empty sentinel bit that stops chains from wrapping into the next column.
+    col_bits = num_rows + 1
+    # Bit distance between neighbouring cells of a chain in each direction
+    chain_shifts = {'hor' : col_bits, 'ver' : 1, 'down' : col_bits - 1, 'up' : col_bits + 1}
+    board_mask : int # every cell of the board
+    top_row_mask : int # the top cell of every column
+
     """ Instance Variables """
     board : List[List[int]]
+    bitboards : Tuple[int, int] # the cells of each player's pieces
 
 
     @staticmethod
@@ -103,7 +111,8 @@ class ConnectFourGameState(StateNode):
                 parent : Optional[StateNode], 
                 last_action: Optional[Action], 
                 depth : int, 
-                current_player_index : int):
+                current_player_index : int,
+                bitboards : Optional[Tuple[int, int]] = None):
         """
         Creates a game state node.
         Takes:
@@ -111,6 +120,9 @@ class ConnectFourGameState(StateNode):
         board: a 2-d list (list of lists) representing the board.
         Numbers are either -1 (no piece), or the index of the player's piece.
 
+        bitboards: the same board as one int per player (see ConnectFourGameState.cell_bit).
+                Computed from board if not given.
+
         parent: the preceding ConnectFourGameState along the path taken to reach the state
                 (the initial state's parent should be None)
         depth: the number of actions taken in the path to reach the state (aka number of plies)
@@ -120,6 +132,11 @@ class ConnectFourGameState(StateNode):
         Use super().__init__() to call this function in the subclass __init__()
         """
         self.board = board
+        if bitboards is None:
+            bitboards = tuple(sum(1 << ConnectFourGameState.cell_bit(r, c)
+                                    for r, row in enumerate(board) for c, piece in enumerate(row) if piece == player)
+                                for player in range(len(ConnectFourGameState.player_names)))
+        self.bitboards = bitboards
         super().__init__(parent=parent,
             last_action=last_action,
             depth=depth,
@@ -138,7 +155,7 @@ class ConnectFourGameState(StateNode):
 
         NOTE: In this case,the current player IS implicitly encoded in the features.
         """
-        return tuple(tuple(row) for row in self.board)
+        return self.bitboards
 
 
     def __str__(self) -> str:
@@ -177,7 +194,7 @@ class ConnectFourGameState(StateNode):
 
     def is_endgame_state(self) -> bool:
         """Returns whether or not this state is an endgame state (terminal)"""
-        if len(self.get_all_actions()) == 0:
+        if (self.bitboards[0] | self.bitboards[1]) & ConnectFourGameState.top_row_mask == ConnectFourGameState.top_row_mask:
             return True
         return self.endgame_utility(0) != 0
 
@@ -204,27 +221,28 @@ class ConnectFourGameState(StateNode):
 
         r = ConnectFourGameState.num_rows - self.get_column_height(action.column) - 1
 
-        new_board = deepcopy(self.board)
+        # Only the changed row is copied; the others are shared with this state
+        new_board = list(self.board)
+        new_board[r] = list(new_board[r])
         new_board[r][action.column] = self.current_player_index
 
+        new_bitboards = list(self.bitboards)
+        new_bitboards[self.current_player_index] |= 1 << ConnectFourGameState.cell_bit(r, action.column)
+
         return ConnectFourGameState(board = new_board,
             parent = self,
             depth = self.depth + 1,
             last_action = action,
-            current_player_index = (self.current_player_index + 1) % len(ConnectFourGameState.player_names) )
+            current_player_index = (self.current_player_index + 1) % len(ConnectFourGameState.player_names),
+            bitboards = tuple(new_bitboards) )
 
 
     """ Additional ConnectFour specific methods, useful for writing heuristic functions """
 
     """Return the number of pieces in the column; e.g., 0 if the column is empty."""
     def get_column_height(self, col_number : int):
-        height = 0
-        for row in reversed(self.board) :
-            if row[col_number] != ConnectFourGameState.EMPTY:
-                height += 1
-            else :
-                break
-        return height
+        column = ((self.bitboards[0] | self.bitboards[1]) >> (col_number * ConnectFourGameState.col_bits))
+        return (column & ((1 << ConnectFourGameState.num_rows) - 1)).bit_length()
 
     """Return True if column is full, False otherwise. Just checks the top row for speed."""
     def is_column_full(self, col_number : int) :
@@ -233,6 +251,36 @@ class ConnectFourGameState(StateNode):
     def get_piece_at(self, row :int , col :int):
         return self.board[row][col]
 
+    @staticmethod
+    def cell_bit(row : int, col : int) -> int:
+        """ The bit of cell (row, col) in a bitboard """
+        return col * ConnectFourGameState.col_bits + ConnectFourGameState.num_rows - 1 - row
+
+    @staticmethod
+    def bit_cell(bit : int) -> Tuple[int, int]:
+        """ The (row, col) of a bit in a bitboard; the inverse of cell_bit """
+        col, height = divmod(bit, ConnectFourGameState.col_bits)
+        return ConnectFourGameState.num_rows - 1 - height, col
+
+    def get_bitboard(self, player_piece : int) -> int:
+        """ The cells holding player_piece (which may be EMPTY) as a bitboard """
+        if player_piece == ConnectFourGameState.EMPTY:
+            return ConnectFourGameState.board_mask & ~(self.bitboards[0] | self.bitboards[1])
+        if player_piece in (0, 1):
+            return self.bitboards[player_piece]
+        return 0
+
+    def count_chains(self, chain_len : int, player_piece : int, direction : str) -> int:
+        """ The number of chain_len runs of player_piece going 'hor' (rightwards), 'ver' (downwards),
+        'down' (diagonal down-right) or 'up' (diagonal up-right).
+        Each bit left in chains starts a run, so this is a few shift-and-ANDs and a popcount instead of a scan of the board. """
+        pieces = self.get_bitboard(player_piece)
+        shift = ConnectFourGameState.chain_shifts[direction]
+        chains = pieces
+        for i in range(1, chain_len):
+            chains &= pieces >> (shift * i)
+        return bin(chains).count('1')
+
     def get_num_chains(self, chain_len : int, player_piece : int):
         if chain_len > 1:
             return (self.get_num_chains_hor(chain_len, player_piece) +
@@ -242,46 +290,17 @@ class ConnectFourGameState(StateNode):
                 return self.get_num_chains_hor(chain_len, player_piece)
                 
     def get_num_chains_hor(self, chain_len : int, player_piece : int):
-        count = 0
         # Horizontal chains
-        # Each leftmost position of a horizontal 4 sequence
-        for r in range(ConnectFourGameState.num_rows):
-            for c in range(ConnectFourGameState.num_cols - chain_len + 1):
-                # check 4 consecutive rightwards all same as player_piece
-                if all(self.board[r][c+i] == player_piece for i in range(0, chain_len)) :
-                    count += 1
-
-        return count
+        return self.count_chains(chain_len, player_piece, 'hor')
 
     def get_num_chains_ver(self, chain_len : int, player_piece : int):
-        count = 0
         # Vertical chains
-        # Each uppermost position of a vertical 4 sequence
-        for c in range(ConnectFourGameState.num_cols):
-            for r in range(ConnectFourGameState.num_rows - chain_len + 1):
-                # check 4 consecutive in diagonal down-right all same as player_piece
-                if all(self.board[r+i][c] == player_piece for i in range(0, chain_len)) :
-                    count += 1
-
-        return count
+        return self.count_chains(chain_len, player_piece, 'ver')
 
     def get_num_chains_diag(self, chain_len : int, player_piece : int):
-        count = 0
-
-        # Diagonal down-right chains
-        # Each leftmost position of a diagonal down 4 sequence
-        for r in range(ConnectFourGameState.num_rows - chain_len + 1):
-            for c in range(ConnectFourGameState.num_cols - chain_len + 1):
-                # check 4 consecutive in digonal down-right same as leftmost player_piece
-                if all(self.board[r+i][c+i] == player_piece for i in range(0, chain_len)) :
-                    count += 1
-
-        # Diagonal up-right chains
-        # Each leftmost position of a diagonal up-right 4 sequence
-        for r in range(chain_len - 1, ConnectFourGameState.num_rows):
-            for c in range(ConnectFourGameState.num_cols - chain_len + 1):
-                # check 4 consecutive in diagonal up-right direction all same as player_piece
-                if all(self.board[r-i][c+i] == player_piece for i in range(0, chain_len)) :
-                    count += 1
-
-        return count
+        # Diagonal down-right and up-right chains
+        return self.count_chains(chain_len, player_piece, 'down') + self.count_chains(chain_len, player_piece, 'up')
+
+ConnectFourGameState.board_mask = sum(1 << ConnectFourGameState.cell_bit(r, c)
+                                        for r in range(ConnectFourGameState.num_rows) for c in range(ConnectFourGameState.num_cols))
+ConnectFourGameState.top_row_mask = sum(1 << ConnectFourGameState.cell_bit(0, c) for c in range(ConnectFourGameState.num_cols))
@@ -130,7 +130,7 @@ def empty_rows_eval_nim(state : NimGameState, player_index : int):
     if state.is_endgame_state():
         return state.endgame_utility(player_index)
 
-    return [state.get_stones_in_pile(p) for p in range(state.get_num_piles())].count(0) / state.get_num_piles()
+    return state.get_stones_per_pile().count(0) / state.get_num_piles()
 
 
 def custom_eval_nim(state : NimGameState, player_index : int):
@@ -183,7 +183,7 @@ def chains_weights_connectfour(state : ConnectFourGameState, player_index : int)
     score = 0
     for chain_len in chain_length_weights:
         score += state.get_num_chains(chain_len, player_index) * chain_length_weights[chain_len]
-        score -= state.get_num_chains(chain_len, player_index %2 + 1) * chain_length_weights[chain_len]
+        score -= state.get_num_chains(chain_len, 1 - player_index) * chain_length_weights[chain_len]
     return max(min(.99,score), -.99)
 
 def custom_eval_connectfour(state : ConnectFourGameState, player_index : int):
@@ -291,12 +291,13 @@ class MoveOrderingAlphaBetaSearchAgent(AlphaBetaSearchAgent):
     A subclass of AlphaBetaSearchAgent. 
     Maintains a lifetime transposition table, which saves best actions for any explored states.
     If you encounter a state in the table, begin by searching the saved move first.
+    The table may be given at construction (e.g. by the GUI, to keep it across searches); otherwise it starts empty.
     """
     t_table: Dict[StateNode, Action]
 
-    def __init__(self, *args, **kwargs): #any extra arguments, don't worry about 'em
+    def __init__(self, *args, t_table : Optional[Dict[StateNode, Action]] = None, **kwargs): #any extra arguments, don't worry about 'em
         super().__init__(*args, **kwargs)
-        self.t_table = {}
+        self.t_table = t_table if t_table is not None else {}
 
     #Override
     def pick_action(self, state : StateNode) -> Optional[Tuple[Action, float, Optional[StateNode]]]:
@@ -30,6 +30,8 @@ StateNode
 
 class Action:
     """ An abstract object that represents an action in an environment """
+    __slots__ = () # lets tuple-based actions stay free of a per-instance __dict__
+
     def __str__(self) -> str:
         """ Returns a string that describes this action """
         raise NotImplementedError
@@ -81,6 +83,10 @@ class StateNode:
     depth : int
     current_player_index : int # index of the current player in player_names. Either 0 or 1
 
+    # Search trees hold many nodes; slots keep the per-node overhead down.
+    # Subclasses that don't declare __slots__ of their own still get a __dict__ for their features.
+    __slots__ = ('parent', 'last_action', 'depth', 'current_player_index')
+
     @staticmethod
     def readFromFile(filename : str) -> StateNode:
         """Reads data from a text file and returns a StateNode which is an initial state.
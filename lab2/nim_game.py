@@ -1,6 +1,5 @@
 from __future__ import annotations
 from typing import Optional, Any, Hashable, Sequence, Iterable, NamedTuple, List, Tuple
-from copy import copy
 
 from gamesearch_problem import StateNode, Action
 
@@ -203,4 +202,15 @@ class NimGameState(StateNode):
         return self.board[pile]
 
     def get_num_piles(self) -> int:
-        return len(self.board)
\ No newline at end of file
+        return len(self.board)
+
+    def get_stones_per_pile(self) -> Tuple[int, ...]:
+        return self.board
+
+    def get_taken_stones(self) -> range:
+        """ The positions (counted from the start of the pile) of the stones the last action took from its pile,
+        worked out from this state's own board. Empty for an initial state. """
+        if self.last_action is None:
+            return range(0)
+        remaining = self.board[self.last_action.pile]
+        return range(remaining, remaining + self.last_action.stones)
\ No newline at end of file
@@ -7,7 +7,7 @@ Usage:
     INITIAL_STATE_FILE is a path to a text file or 'default'
 """
 from __future__ import annotations
-from typing import Optional, Any, Hashable, Sequence, List, Tuple, Callable
+from typing import Optional, Any, Hashable, Sequence, List, Tuple, Callable, Dict, Iterable, FrozenSet
 
 from traceback import format_exc
 from sys import argv
@@ -21,6 +21,10 @@ from tictactoe_game import TicTacToeGameState, TicTacToeAction
 from nim_game import NimGameState, NimAction
 from roomba_game import RoombaRaceGameState, RoombaRaceAction, Coordinate, Terrain, FLOOR, WALL, CLEANED
 import time
+import random
+from math import sqrt
+from concurrent.futures import Future
+from threading import Event, Thread
 
 all_fn_dicts = { RoombaRaceGameState: roomba_functions,
     ConnectFourGameState: connectfour_functions,
@@ -29,6 +33,8 @@ all_fn_dicts = { RoombaRaceGameState: roomba_functions,
 
 MIN_SLEEP = .1
 MIN_TIME_BETWEEN_MOVES = .5
+# While an agent searches, the GUI repaints its progress this often (~30 fps)
+CALLBACK_PAINT_INTERVAL = 1 / 30
 
 ### GUI too big? Change this number
 MAX_HEIGHT = 350
@@ -46,6 +52,11 @@ COLORS = {FLOOR : 'green', WALL : 'gray25', CLEANED : 'white',
           PIECE[0]: 'red', PIECE[1]: 'yellow', FRAME: 'blue',EMPTY: 'white' , TEXT: 'black',
           STONE : 'grey'}
 
+# Piece colors indexed by piece number (tic-tac-toe, connectfour); EMPTY (-1) indexes the last entry
+PIECE_FILLS = (COLORS[PIECE[0]], COLORS[PIECE[1]], COLORS[EMPTY])
+# Roomba terrain types, by their byte code in a flattened maze
+TERRAIN_CODES = {ord(terrain) : terrain for terrain in (FLOOR, WALL, CLEANED)}
+
 AGENT_NAMES =  ["Human", "Random" , "Reflex", "MaxDFS", "Minimax", "Expectimax", "AlphaBeta", "MoveOrderingAlphaBeta", "MCTS"]
 
 BASIC_AGENTS = {"Human": HumanGuiAgentWrapper, "Random": RandomAgentWrapper , "Reflex" : ReflexAgentWrapper}
@@ -57,6 +68,69 @@ ITERATIVE_SEARCH_AGENTS = {"MaxDFS" : IDMaximizingSearchAgentWrapper, "Minimax":
 
 ASSYMETRIC_AGENTS = {"MCTS": MonteCarloTreeSearchAgentWrapper}
 
+# Agents whose chosen move depends only on the state, so it can be remembered in the transposition table
+DETERMINISTIC_AGENTS = {"Reflex" : ReflexAgentWrapper, **SEARCH_AGENTS}
+
+# Sets of wrapper types, for O(1) membership tests
+ITERATIVE_AGENT_TYPES = frozenset(ITERATIVE_SEARCH_AGENTS.values())
+ASYM_AGENT_TYPES = frozenset(ASSYMETRIC_AGENTS.values())
+SEARCH_AGENT_TYPES = frozenset(SEARCH_AGENTS.values())
+DETERMINISTIC_AGENT_TYPES = frozenset(DETERMINISTIC_AGENTS.values())
+
+# Agent categories, which decide what counters are displayed
+HUMAN_AGENT, ITERATIVE_AGENT, ASYM_AGENT, SEARCH_AGENT, OTHER_AGENT = range(5)
+
+def agent_category(agent : AgentWrapper) -> int:
+    agent_type = type(agent)
+    if agent_type == BASIC_AGENTS['Human']:
+        return HUMAN_AGENT
+    elif agent_type in ITERATIVE_AGENT_TYPES:
+        return ITERATIVE_AGENT
+    elif agent_type in ASYM_AGENT_TYPES:
+        return ASYM_AGENT
+    elif agent_type in SEARCH_AGENT_TYPES:
+        return SEARCH_AGENT
+    return OTHER_AGENT
+
+# The counters shown for each agent category (formatted with the wrapped agent), this search's and lifetime totals
+COUNTER_FORMATS = {
+    ITERATIVE_AGENT : 'This search || Max Depth: {0.depth_limit} | Nodes seen: {0.total_nodes} | Leaf evals: {0.total_evals}',
+    ASYM_AGENT : 'This search || Rollouts performed: {0.total_rollouts}',
+    SEARCH_AGENT : 'This search || Nodes seen: {0.total_nodes} | Leaf evals: {0.total_evals}',
+}
+LIFETIME_COUNTER_FORMATS = {
+    ITERATIVE_AGENT : '\n Lifetime total || Nodes seen: {0.lifetime_nodes} | Leaf evals: {0.lifetime_evals}',
+    ASYM_AGENT : '\n Lifetime total || Rollouts performed: {0.total_rollouts}',
+    SEARCH_AGENT : '\n Lifetime total || Nodes seen: {0.lifetime_nodes} | Leaf evals: {0.lifetime_evals}',
+}
+
+def color_rgb(master : Tk, color : str) -> bytes:
+    """ The 3 RGB bytes of a Tk color name, for building PPM images """
+    return bytes(v >> 8 for v in master.winfo_rgb(color))
+
+def ppm_header(w : int, h : int) -> bytes:
+    return b'P6\n%d %d\n255\n' % (w, h)
+
+def bit_indices(bits : int) -> Iterable[int]:
+    """ The index of every set bit of bits (e.g. the cells of a bitboard), lowest first """
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+def run_on_daemon_thread(fn : Callable, *args) -> Future:
+    """ Start fn(*args) on a daemon thread, returning a Future for its result (or exception).
+    Unlike executor threads, it isn't joined when the program exits, so a search still running then can't keep it alive. """
+    future = Future()
+    def run():
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+    Thread(target=run, daemon=True).start()
+    return future
+
 STEP_TIME_OPTIONS = (0.00, 0.01, 0.02, 0.03, 0.04, 0.05, 0.06, 0.07, 0.08, 0.09,
                     0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 2.0, 5.0)
 
@@ -78,6 +152,36 @@ VALID_STATUS_TRANSITIONS = {
     SEARCH_ERROR : tuple()
 }
 
+# Button options set on entering each status; options not listed keep their previous value
+STATUS_UI_TABLE = {
+    INITIAL_WAITING : {'restart_button' : {'text' : "Restart Game", 'state' : NORMAL, 'bg' : 'orange red'},
+                       'history_button' : {'state' : NORMAL, 'bg' : 'orchid1'}},
+    SEARCHING_RUNNING : {'restart_button' : {'text' : "Terminate Turn"},
+                        'undo_move_button' : {'state' : DISABLED, 'bg' : 'grey'},
+                        'history_button' : {'state' : DISABLED, 'bg' : 'grey'},
+                        'start_turn_button' : {'state' : DISABLED, 'bg' : 'grey'}},
+    TERMINATING_EARLY : {'restart_button' : {'state' : DISABLED, 'bg' : 'grey'},
+                        'history_button' : {'state' : DISABLED, 'bg' : 'grey'},
+                        'start_turn_button' : {'state' : DISABLED, 'bg' : 'grey'}},
+    FINISHED_COMPLETE : {'restart_button' : {'text' : "Restart Game", 'state' : NORMAL, 'bg' : 'orange red'},
+                        'undo_move_button' : {'state' : DISABLED, 'bg' : 'grey'},
+                        'history_button' : {'state' : DISABLED, 'bg' : 'grey'},
+                        'start_turn_button' : {'state' : DISABLED, 'bg' : 'grey'}},
+    SEARCH_ERROR : {'restart_button' : {'state' : DISABLED, 'bg' : 'grey'},
+                    'undo_move_button' : {'state' : DISABLED, 'bg' : 'grey'},
+                    'history_button' : {'state' : DISABLED, 'bg' : 'grey'},
+                    'start_turn_button' : {'state' : DISABLED, 'bg' : 'grey'}},
+}
+STATUS_UI_TABLE[FINISHED_NO_ACTION] = STATUS_UI_TABLE[FINISHED_COMPLETE]
+
+# Extra button options for INITIAL_WAITING, depending on whether it is a human's turn
+TURN_UI_TABLE = {
+    True : {'undo_move_button' : {'state' : NORMAL, 'bg' : 'DodgerBlue2'},
+            'start_turn_button' : {'state' : DISABLED, 'bg' : 'grey'}},
+    False : {'undo_move_button' : {'state' : DISABLED, 'bg' : 'grey'},
+            'start_turn_button' : {'state' : NORMAL, 'bg' : 'green'}},
+}
+
 STATUS_TEXT = { INITIAL_WAITING: "P{} [{}] {}'s turn: Waiting...",
                 SEARCHING_RUNNING:"P{} [{}] {}'s turn: Thinking...",
                 TERMINATING_EARLY: "P{} [{}] {}'s turn: Giving up...",
@@ -93,7 +197,10 @@ class PlayGameGui:
             if agent != None:
                 agent.setup_agent(self.alg_callback)
 
-        self.current_agent : AgentWrapper = playing_agents[initial_state.current_player_index]
+        # Each player's agent category, and whether its moves can be remembered, worked out once rather than every turn
+        self.agent_categories : Dict[int, int] = {p : agent_category(agent) for p, agent in playing_agents.items()}
+        self.agent_cacheable : Dict[int, bool] = {p : type(agent) in DETERMINISTIC_AGENT_TYPES for p, agent in playing_agents.items()}
+        self.set_current_agent(initial_state.current_player_index)
 
         self.master = master
 
@@ -104,8 +211,28 @@ class PlayGameGui:
 
         self.search_result_best_action : StateNode  = None
 
+        # Searches run on a worker thread, which must not touch Tk. It only reads these plain attributes
+        # and posts its latest step in _callback_step for the main thread to paint.
+        self._closed = False # set when the window is closed, to leave the game loop (and the program)
+        self._terminate = Event() # set by the Terminate Turn button; also wakes the worker from its step time
+        self._callback_step : Optional[Tuple[StateNode, float, Optional[str]]] = None
+        self._step_time = 0.1
+
+        # Transposition table of chosen moves, indexed by Zobrist hash of the state
+        self._zobrist : Dict[Hashable, int] = {key : random.getrandbits(64) for key in self.zobrist_keys()}
+        self._zobrist_turn : Tuple[int, ...] = tuple(random.getrandbits(64) for p in initial_state.player_names)
+        self._tt : Dict[Tuple, Tuple[Action, Optional[float]]] = {} # (hash, player, depth limit) -> (action, exp util)
+        self._current_hash : int = self._state_hash(self.current_state) # kept up to date move by move
+        self._actions_cache : Dict[StateNode, FrozenSet[Action]] = {}
+        self._result_note : Optional[str] = None # shown with the chosen move when it didn't come from a search
+
+        # Background canvas items that are created once and only moved when the canvas is resized
+        self.static_items : Dict[Hashable, int] = {}
+
         #########################################################################################
 
+        master.protocol("WM_DELETE_WINDOW", self.on_close)
+
         self.canvas = Canvas(master, height=canvas_height, width=canvas_width, bg='white')
 
         self.canvas.grid(row = 0, columnspan = 5) #pack(fill=tk.BOTH, expand=True)
@@ -148,6 +275,7 @@ class PlayGameGui:
         status_output_frame.grid(row = 2, columnspan = 5,sticky = N)
 
         self.status = None
+        self._ui_cache : Dict[str, Dict[str, Any]] = {} # last options sent to each button
 
         self.status_text = StringVar()
         self.status_label = Label(status_output_frame, textvariable = self.status_text, anchor = CENTER, bg = "lightblue", pady = 3, justify = CENTER, relief = GROOVE)
@@ -177,7 +305,8 @@ class PlayGameGui:
         self.counter_label_1.grid(row= 3,sticky = N)
         #########################################################################################
 
-        if any(getattr(agent, 'show_thinking', False) for agent in self.playing_agents.values()):
+        self.show_thinking = any(getattr(agent, 'show_thinking', False) for agent in self.playing_agents.values())
+        if self.show_thinking:
 
             status_output_settings_frame = Frame(master, padx = 3,width = 30)
             status_output_settings_frame.grid(row = 3, columnspan = 5,sticky = NW)
@@ -201,7 +330,10 @@ class PlayGameGui:
             self.step_time_label = Label(step_time_spinbox_frame, text = "Step time: ")
             self.step_time_label.grid(row= 0, column = 0, sticky = NW)
 
-            self.step_time_spinbox = Spinbox(step_time_spinbox_frame,
+            # Mirror the spinbox into a float as it changes, rather than parsing its text on every search step
+            self.step_time_var = DoubleVar(value = 0.1)
+            self.step_time_var.trace_add('write', self.on_step_time_changed)
+            self.step_time_spinbox = Spinbox(step_time_spinbox_frame, textvariable = self.step_time_var,
             values=STEP_TIME_OPTIONS, format="%3.2f", width = 4)
             self.step_time_spinbox.grid(row= 0, column = 1, sticky = NW)
             while(self.step_time_spinbox.get() != "0.1") :
@@ -216,12 +348,12 @@ class PlayGameGui:
     def continue_game(self):
         self.visualize_state(self.current_state.get_as_root_node())
         while not self.current_state.is_endgame_state():
-            self.current_agent = self.playing_agents[self.current_state.current_player_index]
+            self.set_current_agent(self.current_state.current_player_index)
             self.update_status_and_ui(INITIAL_WAITING)
 
             if not self.is_human_turn():
                 while not (self.auto_start_turn_state.get() or self.can_start_turn):
-                    self.master.update()
+                    self.update_window()
                     time.sleep(.05)
 
             try:
@@ -235,8 +367,9 @@ class PlayGameGui:
                     self.update_status_and_ui(FINISHED_COMPLETE)
                     self.update_text_lifetime(self.search_result_best_exp_util)
                     for i in range(int(MIN_TIME_BETWEEN_MOVES / MIN_SLEEP)):
-                        self.master.update()
+                        self.update_window()
                         time.sleep(MIN_SLEEP)
+                    self._current_hash ^= self._move_hash(self.current_state, self.search_result_best_action)
                     self.current_state = self.current_state.get_next_state(self.search_result_best_action)
                     self.visualize_state(self.current_state.get_as_root_node())
                 else:
@@ -266,7 +399,7 @@ class PlayGameGui:
                         print("P{} [{}] {} scored {:.4f}!".format(i, self.current_state.player_names[i],self.playing_agents[i].name, u))
 
 
-            self.master.update()
+            self.update_window()
 
     def run_agent_choose_action(self) -> bool:
         # Return True if agent chooses action, return False if Human GUI Agent, wait for click)
@@ -277,13 +410,85 @@ class PlayGameGui:
             return False
 
         self.update_status_and_ui(SEARCHING_RUNNING)
-        result = self.current_agent.choose_action(self.search_root_state)
+
+        # Reuse the move from an earlier search of the same position (e.g. after undo)
+        cacheable = self._agent_cacheable
+        tt_key = (self._current_hash, self.current_state.current_player_index, getattr(self.current_agent, 'depth_limit', None))
+        if cacheable and tt_key in self._tt:
+            self.search_result_best_action, self.search_result_best_exp_util = self._tt[tt_key]
+            # Nothing was searched: zero this search's counters rather than show the last search's, and say where the move came from
+            if self._agent_category == SEARCH_AGENT:
+                self.current_agent.agent.reset_total_counts()
+            self._result_note = "Move remembered from an earlier search of this position"
+            if self.current_agent.verbose:
+                print("{} reuses its earlier move from this state: {}".format(self.current_agent.name, self.search_result_best_action))
+            return True
+        self._result_note = None
+
+        self._terminate.clear()
+        result = self.wait_for_search(run_on_daemon_thread(self.current_agent.choose_action, self.search_root_state))
         
         self.search_result_best_action, self.search_result_best_exp_util, _ = result if result is not None else (None, None, None)
+        if cacheable and self.search_result_best_action != None and self.status != TERMINATING_EARLY:
+            self._tt[tt_key] = (self.search_result_best_action, self.search_result_best_exp_util)
         return True
 
+    def wait_for_search(self, future : Future):
+        """ Keep the GUI responsive while the worker thread searches, painting its progress. 
+        Re-raises any exception from the search. """
+        while not future.done():
+            self.paint_callback_step()
+            self.update_window()
+            time.sleep(CALLBACK_PAINT_INTERVAL)
+        return future.result()
+
+    def update_window(self):
+        """ Process pending window events. If that closed the window, exit from here rather than carry on with a dead window:
+        SystemExit isn't caught as a search error on the way out, and ends mainloop too. """
+        self.master.update()
+        if self._closed:
+            raise SystemExit
+
+    def on_close(self):
+        """ Window closed: stop any search, waking the worker from its step time, then close the window """
+        self._closed = True
+        self._terminate.set()
+        self.master.destroy()
+
+    def paint_callback_step(self):
+        """ Show the latest search step posted by alg_callback, if any """
+        if (step := self._callback_step) is None:
+            return
+        self._callback_step = None
+        state, cur_value, message = step
+
+        if self.print_status_state.get():
+            self.update_text(cur_value, message)
+        if self.visualize_callbacks_state.get() :
+            self.visualize_state(state)
+
+    def _state_hash(self, state : StateNode) -> int:
+        """ Zobrist hash of a state: XOR of the keys of every occupied cell and the player to move """
+        h = self._zobrist_turn[state.current_player_index]
+        for key in self.occupied_cells(state):
+            h ^= self._zobrist[key]
+        return h
+
+    def _move_hash(self, state : StateNode, action : Action) -> int:
+        """ What taking action from state XORs into its Zobrist hash; XOR it again to take the move back """
+        num_players = len(state.player_names)
+        h = self._zobrist_turn[state.current_player_index] ^ self._zobrist_turn[(state.current_player_index + 1) % num_players]
+        for key in self.move_cells(state, action):
+            h ^= self._zobrist[key]
+        return h
+
+    def set_current_agent(self, player_index : int):
+        self.current_agent = self.playing_agents[player_index]
+        self._agent_category = self.agent_categories[player_index]
+        self._agent_cacheable = self.agent_cacheable[player_index]
+
     def is_human_turn(self):
-        return type(self.current_agent) == BASIC_AGENTS['Human']
+        return self._agent_category == HUMAN_AGENT
 
     def update_status_and_ui(self, newstatus = INITIAL_WAITING):
         if newstatus == self.status: # No change?
@@ -300,113 +505,75 @@ class PlayGameGui:
         if newstatus == INITIAL_WAITING :
             self.can_start_turn = False
 
-            self.restart_button['text'] = "Restart Game"
-            self.restart_button['state'] = NORMAL
-            self.restart_button['bg'] = 'orange red'
-            self.history_button['state'] = NORMAL
-            self.history_button['bg'] = 'orchid1'
-
-            if self.is_human_turn():
-                self.undo_move_button['state'] = NORMAL 
-                self.undo_move_button['bg'] = 'DodgerBlue2' 
-                self.start_turn_button['state'] = DISABLED
-                self.start_turn_button['bg'] = 'grey'  
-            else:
-                self.undo_move_button['state'] = DISABLED
-                self.undo_move_button['bg'] = 'grey'
-                self.start_turn_button['state'] =NORMAL
-                self.start_turn_button['bg'] = 'green'
-
-
-        elif newstatus in (SEARCHING_RUNNING,):
-            self.restart_button['text'] = "Terminate Turn"
-            self.undo_move_button['state'] = DISABLED
-            self.undo_move_button['bg'] = 'grey'
-            self.history_button['state'] = DISABLED
-            self.history_button['bg'] = 'grey'
-            self.start_turn_button['state'] = DISABLED 
-            self.start_turn_button['bg'] = 'grey'
-
-        elif newstatus in (TERMINATING_EARLY,):
-            self.restart_button['state'] = DISABLED
-            self.restart_button['bg'] = 'grey'
-            self.history_button['state'] = DISABLED
-            self.history_button['bg'] = 'grey'
-            self.start_turn_button['state'] = DISABLED 
-            self.start_turn_button['bg'] = 'grey'
-
-        elif newstatus in (FINISHED_NO_ACTION,FINISHED_COMPLETE) :
-            self.restart_button['text'] = "Restart Game"
-            self.restart_button['state'] = NORMAL
-            self.restart_button['bg'] = 'orange red'
-            self.undo_move_button['state'] = DISABLED
-            self.undo_move_button['bg'] = 'grey'
-            self.history_button['state'] = DISABLED
-            self.history_button['bg'] = 'grey'
-            self.start_turn_button['state'] = DISABLED 
-            self.start_turn_button['bg'] = 'grey'
-
-        elif newstatus in (SEARCH_ERROR,):
-            self.restart_button['state'] = DISABLED
-            self.restart_button['bg'] = 'grey'
-            self.undo_move_button['state'] = DISABLED
-            self.undo_move_button['bg'] = 'grey'
-            self.history_button['state'] = DISABLED
-            self.history_button['bg'] = 'grey'
-            self.start_turn_button['state'] = DISABLED 
-            self.start_turn_button['bg'] = 'grey'
+        ui_options = STATUS_UI_TABLE[newstatus]
+        if newstatus == INITIAL_WAITING :
+            ui_options = {**ui_options, **TURN_UI_TABLE[self.is_human_turn()]}
 
-        self.master.update()
+        # Only send Tk the options that actually change
+        for widget_name, options in ui_options.items():
+            current = self._ui_cache.setdefault(widget_name, {})
+            delta = {option : value for option, value in options.items() if current.get(option) != value}
+            if delta:
+                getattr(self, widget_name).configure(**delta)
+                current.update(delta)
+
+        self.update_window()
         return newstatus
 
 
     def restart_game(self, event = None) :
         if self.status in (INITIAL_WAITING,FINISHED_COMPLETE, FINISHED_NO_ACTION):
+            self._tt.clear()
+            self._actions_cache.clear()
             self.current_state = self.initial_state
+            self._current_hash = self._state_hash(self.current_state)
             self.visualize_state(self.current_state.get_as_root_node())
             self.update_status_and_ui(INITIAL_WAITING)
             self.continue_game()
         elif self.status in (SEARCHING_RUNNING,):
+            self._terminate.set()
             self.update_status_and_ui(TERMINATING_EARLY)
 
     def undo_last_move(self, event = None):
         if self.status in (INITIAL_WAITING,):
             if self.current_state.parent != None:
                 # back to last human turn
-                self.current_state = self.current_state.parent
-                self.current_agent = self.playing_agents[self.current_state.current_player_index]
+                self.step_back()
+                self.set_current_agent(self.current_state.current_player_index)
                 while self.current_state.parent != None and not self.is_human_turn():
-                    self.current_state = self.current_state.parent
-                    self.current_agent = self.playing_agents[self.current_state.current_player_index]
+                    self.step_back()
+                    self.set_current_agent(self.current_state.current_player_index)
 
                 self.continue_game()
 
-    def alg_callback(self, state, cur_value, message=None):
-        self.restart_button.update()
-        self.visualize_callbacks_checkbox.update()
-        self.print_status_checkbox.update()
+    def step_back(self):
+        """ Return to the parent of the current state, taking its move back out of the hash """
+        undone_action = self.current_state.last_action
+        self.current_state = self.current_state.parent
+        self._current_hash ^= self._move_hash(self.current_state, undone_action)
 
-        if self.print_status_state.get():
-            self.update_text(cur_value, message)
-        if self.visualize_callbacks_state.get() :
-            self.visualize_state(state)
-        if self.status == SEARCHING_RUNNING :
-            time.sleep(float(self.step_time_spinbox.get()))
+    def on_step_time_changed(self, *args):
+        try:
+            self._step_time = self.step_time_var.get()
+        except TclError: # not a number (yet); keep the last valid step time
+            pass
 
-        return (self.status == TERMINATING_EARLY)
+    def alg_callback(self, state, cur_value, message=None):
+        # Called from the search (worker) thread: no Tk calls here, just post the step for the main thread to paint
+        if not self._terminate.is_set() :
+            self._callback_step = (state, cur_value, message)
+            if self._step_time:
+                # Wait out the step time, unless the turn is terminated meanwhile
+                self._terminate.wait(self._step_time)
+
+        return self._terminate.is_set()
 
 
     def update_text_lifetime(self, exp_util : Optional[float]):
-        self.update_text(exp_util)
+        self.update_text(exp_util, self._result_note)
 
-        if self.is_human_turn():
-            return
-        elif type(a := self.current_agent) in ITERATIVE_SEARCH_AGENTS.values():
-            self.counter_text_1.set(self.counter_text_1.get() + '\n Lifetime total || Nodes seen: {} | Leaf evals: {}'.format(a.agent.lifetime_nodes, a.agent.lifetime_evals))
-        elif type(a) in ASSYMETRIC_AGENTS.values():
-            self.counter_text_1.set(self.counter_text_1.get() + '\n Lifetime total || Rollouts performed: {}'.format(a.agent.total_rollouts))
-        elif type(self.current_agent) in SEARCH_AGENTS.values():
-            self.counter_text_1.set(self.counter_text_1.get() + '\n Lifetime total || Nodes seen: {} | Leaf evals: {}'.format(a.agent.lifetime_nodes, a.agent.lifetime_evals))
+        if (lifetime := LIFETIME_COUNTER_FORMATS.get(self._agent_category)) is not None:
+            self.counter_text_1.set(self.counter_text_1.get() + lifetime.format(self.current_agent.agent))
 
 
     def update_text(self, exp_util : Optional[float], message = None):
@@ -421,16 +588,8 @@ class PlayGameGui:
         else :
             self.callback_msg_text.set('')
 
-        if self.is_human_turn():
-            self.counter_text_1.set("")
-        elif type((a := self.current_agent)) in ITERATIVE_SEARCH_AGENTS.values():
-            self.counter_text_1.set('This search || Max Depth: {} | Nodes seen: {} | Leaf evals: {}'.format(a.agent.depth_limit, a.agent.total_nodes, a.agent.total_evals))
-        elif type(a) in ASSYMETRIC_AGENTS.values():
-            self.counter_text_1.set('This search || Rollouts performed: {}'.format(a.agent.total_rollouts))
-        elif type(self.current_agent) in SEARCH_AGENTS.values():
-            self.counter_text_1.set('This search || Nodes seen: {} | Leaf evals: {}'.format(a.agent.total_nodes, a.agent.total_evals))
-        else:
-            self.counter_text_1.set("")
+        counters = COUNTER_FORMATS.get(self._agent_category)
+        self.counter_text_1.set(counters.format(self.current_agent.agent) if counters else "")
 
     def start_turn(self):
         self.can_start_turn = True
@@ -441,28 +600,79 @@ class PlayGameGui:
                 self.visualize_state(self.current_state.get_as_root_node())
             else:
                 self.visualize_state(self.current_state)
-            self.master.update()
+            self.update_window()
 
     def visualize_state(self, state):
         self.display_state = state
         self.draw_path_to_state()
-        self.canvas.update()
+        self.update_window()
 
     def click_canvas_attempt_action(self, event = None):
         if self.status == INITIAL_WAITING and self.is_human_turn():
             action = self.click_canvas_to_action(event)
-            if action != None and action in self.current_state.get_all_actions() :
+            if action != None and action in self._actions_for(self.current_state) :
 
                 self.update_status_and_ui(FINISHED_COMPLETE)
-                self.visualize_state(self.current_state.get_as_root_node().get_next_state(action)) #display the next best move.
+                # Compute the successor once: display it as a child of the search root, then hang it under the real history
+                next_state = self.search_root_state.get_next_state(action)
+                self.visualize_state(next_state) #display the next best move.
                 self.update_text(self.search_result_best_exp_util)
                 time.sleep(1)
-                self.current_state = self.current_state.get_next_state(action)
+                next_state.parent, next_state.depth = self.current_state, self.current_state.depth + 1
+                self._current_hash ^= self._move_hash(self.current_state, action)
+                self.current_state = next_state
                 self.visualize_state(self.current_state.get_as_root_node())
             else:
                 self.update_status_and_ui(FINISHED_NO_ACTION)
             self.continue_game()
 
+    def _actions_for(self, state : StateNode) -> FrozenSet[Action]:
+        """ Legal actions of a state, memoized so repeated clicks on the same position are a set lookup """
+        if (actions := self._actions_cache.get(state)) is None:
+            actions = self._actions_cache[state] = frozenset(state.get_all_actions())
+        return actions
+
+    def measure_canvas(self, num_rows : int, num_cols : int) -> Tuple[int, int]:
+        """ Read the canvas size once per redraw, and precompute the pixel edges and centers of every row and column """
+        w = self.canvas.winfo_width() # Get current width of canvas
+        h = self.canvas.winfo_height() # Get current height of canvas
+        self.xs = [w * c // num_cols for c in range(num_cols + 1)]
+        self.ys = [h * r // num_rows for r in range(num_rows + 1)]
+        self.center_xs = [int(w * (c + .5)) // num_cols for c in range(num_cols)]
+        self.center_ys = [int(h * (r + .5)) // num_rows for r in range(num_rows)]
+        # Kept for mapping clicks back to cells, without asking Tk for the canvas size again
+        self._canvas_size = (w, h)
+        return w, h
+
+    def place_item(self, key : Hashable, create : Callable[..., int], *coords, **options) -> int:
+        """ Move the static canvas item stored under key to coords, creating it with options the first time """
+        if (item := self.static_items.get(key)) is None:
+            item = self.static_items[key] = create(*coords, **options)
+        else:
+            self.canvas.coords(item, *coords)
+        return item
+
+    def draw_grid_lines(self, w, h, **line_options):
+        """ Draw all vertical lines as a single polyline item, and all horizontal lines as another.
+        Each line is retraced back to the edge it started from, so the connecting segments run along the canvas border. """
+        verticals = [coord for x in self.xs[:-1] for coord in (x, 0, x, h, x, 0)]
+        horizontals = [coord for y in self.ys[:-1] for coord in (0, y, w, y, 0, y)]
+        self.place_item('vertical_lines', self.canvas.create_line, *verticals, tag='grid_line', **line_options)
+        self.place_item('horizontal_lines', self.canvas.create_line, *horizontals, tag='grid_line', **line_options)
+
+    def click_to_cell(self, event, num_rows : int, num_cols : int) -> Tuple[int, int]:
+        """ The (row, col) of the cell under a click, using the canvas size from the last measure_canvas.
+        Multiplying before dividing inverts the edge tables (xs[c] = w * c // num_cols) exactly,
+        even when the canvas size isn't a multiple of the cell count """
+        w, h = self._canvas_size
+        return (((event.y + 1) * num_rows - 1) // h, ((event.x + 1) * num_cols - 1) // w)
+
+    def calculate_box_coords(self, r, c):
+        return (self.xs[c], self.ys[r], self.xs[c + 1], self.ys[r + 1])
+
+    def calculate_center_coords(self, r, c):
+        return (self.center_xs[c], self.center_ys[r])
+
     def draw_path_to_state(self, event = None):
         raise NotImplementedError
 
@@ -472,6 +682,18 @@ class PlayGameGui:
     def click_canvas_to_action(self, event):
         raise NotImplementedError
 
+    def zobrist_keys(self) -> Iterable[Hashable]:
+        """ All the (cell, piece) keys that occupied_cells can ever yield """
+        raise NotImplementedError
+
+    def occupied_cells(self, state : StateNode) -> Iterable[Hashable]:
+        """ The (cell, piece) keys describing the given state """
+        raise NotImplementedError
+
+    def move_cells(self, state : StateNode, action : Action) -> Iterable[Hashable]:
+        """ The (cell, piece) keys that taking action from state adds or removes """
+        raise NotImplementedError
+
 class RoombaRaceGUI(PlayGameGui):
     def __init__(self, master, current_state, playing_agents):
         master.title("Roomba Race Visualizer")
@@ -480,88 +702,136 @@ class RoombaRaceGUI(PlayGameGui):
         self.maze_height = current_state.get_height()
 
         self.text_size = MAX_HEIGHT // (self.maze_height * 2)
-        super().__init__(master, initial_state, canvas_height = MAX_HEIGHT, canvas_width = MAX_HEIGHT * self.maze_width // self.maze_height, playing_agents = playing_agents)
-
-    def calculate_box_coords(self, r, c):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        x1 = w * c // self.maze_width
-        y1 = h * r // self.maze_height
-        x2 = w * (c + 1) // self.maze_width
-        y2 = h * (r + 1) // self.maze_height
-        return (x1, y1, x2, y2)
 
-    def calculate_center_coords(self, r, c):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        x = int(w * (c + .5)) // self.maze_width
-        y = int(h * (r + .5)) // self.maze_height
-        return (x, y)
+        # Terrain is drawn as a single image; RGB bytes for each terrain type, indexed by its byte code
+        self.terrain_rgb : List[bytes] = [b''] * 256
+        for code, terrain in TERRAIN_CODES.items():
+            self.terrain_rgb[code] = color_rgb(master, COLORS[terrain])
+        self.terrain_img = None
+        self.terrain_img_size = None
+
+        # Path to the displayed state and each player's positions along it, extended incrementally between redraws
+        self.path_states : List[RoombaRaceGameState] = []
+        self.path_index : Dict[int, int] = {} # id(state) -> index in path_states
+        self.path_positions : List[List[Coordinate]] = [[] for p in RoombaRaceGameState.player_names]
+        self.path_lines : List[int] = [] # persistent canvas line per player
+        self.agent_items : List[int] = [] # persistent canvas oval per player, moved rather than recreated
+        super().__init__(master, initial_state, canvas_height = MAX_HEIGHT, canvas_width = MAX_HEIGHT * self.maze_width // self.maze_height, playing_agents = playing_agents)
 
     def draw_path_to_state(self, event = None):
-        self.canvas.delete('path_line')
-        self.canvas.delete('agent')
+        self.measure_canvas(self.maze_height, self.maze_width)
         self.canvas.delete('cleaned_terrain')
 
-        path = self.display_state.get_path()
+        self.update_path_cache(self.display_state)
 
         # Draw cleaned terrain
-        maze = self.current_state.get_grid()
-
-        for r in range(0,self.maze_height):
-            for c in range(0,self.maze_width):
-                if maze[r][c] == CLEANED:
-                    x1, y1, x2, y2 = self.calculate_box_coords(r,c)
-                    self.canvas.create_rectangle(x1, y1, x2, y2, fill= COLORS[maze[r][c]], tag='cleaned_terrain')
+        xs, ys, create_rectangle, fill = self.xs, self.ys, self.canvas.create_rectangle, COLORS[CLEANED]
+        for r, c in self.cleaned_cells(self.current_state.get_grid_bytes()):
+            create_rectangle(xs[c], ys[r], xs[c+1], ys[r+1], fill= fill, tag='cleaned_terrain')
 
         for p in range(len(RoombaRaceGameState.player_names)):
             curr_r, curr_c = self.display_state.get_position(p)
             x1, y1, x2, y2 = self.calculate_box_coords(curr_r,curr_c)
-            self.canvas.create_oval(x1, y1, x2, y2, fill= COLORS[AGENT[p]], tag='agent')
-
-            path_rc = [state.get_position(p) for state in path]
-            path_coords = [self.calculate_center_coords(r,c)
-                            for r,c in path_rc]
-            if len(path_coords) > 1:
-                self.canvas.create_line(path_coords, fill = COLORS[PATH[p]], width = 3, tag='path_line', )
+            if p == len(self.agent_items):
+                self.agent_items.append(self.canvas.create_oval(x1, y1, x2, y2, fill= COLORS[AGENT[p]], tag='agent'))
+            else:
+                self.canvas.coords(self.agent_items[p], x1, y1, x2, y2)
+
+            path_coords = [coord for r,c in self.path_positions[p] for coord in self.calculate_center_coords(r,c)]
+            if p == len(self.path_lines):
+                self.path_lines.append(self.canvas.create_line(0, 0, 0, 0, fill = COLORS[PATH[p]], width = 3, tag='path_line', state = HIDDEN))
+            if len(path_coords) > 2:
+                self.canvas.coords(self.path_lines[p], *path_coords)
+                self.canvas.itemconfigure(self.path_lines[p], state = NORMAL)
+            else:
+                self.canvas.itemconfigure(self.path_lines[p], state = HIDDEN)
+        # Keep the agents above the cleaned terrain just recreated, and the path lines above both
+        self.canvas.tag_raise('agent')
+        self.canvas.tag_raise('path_line')
+
+    def update_path_cache(self, state : RoombaRaceGameState):
+        """ Make path_states/path_positions describe the path to state, only walking back to the
+        nearest state already in the cached path """
+        new_states = []
+        s = state
+        while s is not None and not ((i := self.path_index.get(id(s))) is not None and self.path_states[i] is s):
+            new_states.append(s)
+            s = s.parent
+
+        keep = 0 if s is None else i + 1
+        for dropped in self.path_states[keep:]:
+            del self.path_index[id(dropped)]
+        del self.path_states[keep:]
+        for positions in self.path_positions:
+            del positions[keep:]
+
+        for s in reversed(new_states):
+            self.path_index[id(s)] = len(self.path_states)
+            self.path_states.append(s)
+            for p, positions in enumerate(self.path_positions):
+                positions.append(s.get_position(p))
 
 
     def draw_background(self, event = None):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-
-        # Clear the background grid and terrain
-        self.canvas.delete('grid_line')
-        self.canvas.delete('terrain_block')
-
-        # Creates all vertical lines
-        for c in range(0, self.maze_width):
-            x = w * c // self.maze_width
-            self.canvas.create_line([(x, 0), (x, h)], tag='grid_line')
-
-        # Creates all horizontal lines
-        for r in range(0, self.maze_height):
-            y = h * r // self.maze_height
-            self.canvas.create_line([(0, y), (w, y)], tag='grid_line')
-
-        # Draw terrain
-        maze = self.initial_state.get_grid()
-        for r in range(0,self.maze_height):
-            for c in range(0,self.maze_width):
-                terrain = maze[r][c]
-                x1, y1, x2, y2 = self.calculate_box_coords(r,c)
-                self.canvas.create_rectangle(x1, y1, x2, y2, fill= COLORS[terrain], tag='terrain_block')
+        w, h = self.measure_canvas(self.maze_height, self.maze_width)
+
+        # Draw terrain as one image, only rebuilt when the canvas size changes
+        terrain_item = self.place_item('terrain', self.canvas.create_image, 0, 0, anchor = NW, tag='terrain_block')
+        if self.terrain_img_size != (w, h):
+            self.terrain_img = PhotoImage(data = self.terrain_ppm(w, h))
+            self.terrain_img_size = (w, h)
+            self.canvas.itemconfigure(terrain_item, image = self.terrain_img)
+
+        # Creates all grid lines, one canvas item per axis
+        self.draw_grid_lines(w, h)
+
+        self.canvas.tag_lower('grid_line')
+        self.canvas.tag_lower('terrain_block')
+
+    def terrain_ppm(self, w, h) -> bytes:
+        """ Binary PPM image of the initial terrain at the given canvas size (as last measured by measure_canvas) """
+        maze = self.initial_state.get_grid_bytes()
+        rgb = self.terrain_rgb
+        widths = [self.xs[c+1] - self.xs[c] for c in range(self.maze_width)]
+        ys = self.ys
+        pixels = bytearray()
+        for r in range(self.maze_height):
+            row = maze[r * self.maze_width : (r+1) * self.maze_width]
+            pixel_row = b''.join(rgb[terrain] * width for terrain, width in zip(row, widths))
+            pixels += pixel_row * (ys[r+1] - ys[r])
+        return ppm_header(w, h) + bytes(pixels)
 
     def click_canvas_to_action(self, event):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        col = event.x // (w //  self.maze_width)
-        h = self.canvas.winfo_height() # Get current height of canvas
-        row = event.y // (h //  self.maze_height)
+        row, col = self.click_to_cell(event, self.maze_height, self.maze_width)
         # print('clicked {}'.format(col))
         cur_r, cur_c = self.current_state.get_position(self.current_state.current_player_index)
         dr, dc = row - cur_r, col - cur_c
         return RoombaRaceAction(dr, dc)
 
+    def cleaned_cells(self, maze : bytes) -> Iterable[Tuple[int, int]]:
+        """ (row, col) of every CLEANED cell of a flattened maze, found with bytes.find rather than testing each cell """
+        cleaned = CLEANED.encode()
+        i = maze.find(cleaned)
+        while i != -1:
+            yield divmod(i, self.maze_width)
+            i = maze.find(cleaned, i + 1)
+
+    def zobrist_keys(self):
+        return [(r, c, piece) for r in range(self.maze_height) for c in range(self.maze_width)
+                    for piece in (CLEANED, AGENT[0], AGENT[1])]
+
+    def occupied_cells(self, state):
+        for r, c in self.cleaned_cells(state.get_grid_bytes()):
+            yield (r, c, CLEANED)
+        for p in range(len(RoombaRaceGameState.player_names)):
+            yield (*state.get_position(p), AGENT[p])
+
+    def move_cells(self, state, action):
+        # The roomba leaves its cell cleaned behind it
+        p = state.current_player_index
+        r, c = state.get_position(p)
+        return ((r, c, AGENT[p]), (r, c, CLEANED), (r + action.r, c + action.c, AGENT[p]))
+
 
 class TicTacToeGUI(PlayGameGui):
     def __init__(self, master, initial_state, playing_agents):
@@ -571,160 +841,190 @@ class TicTacToeGUI(PlayGameGui):
         self.num_cols = TicTacToeGameState.num_cols
         self.text_size = MAX_HEIGHT // (self.num_rows * 2)
         self.margin = 5
-        super().__init__(master, initial_state, canvas_height = MAX_HEIGHT, canvas_width = MAX_HEIGHT * self.num_cols // self.num_rows , playing_agents = playing_agents)
-
-    def calculate_box_coords(self, r, c):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        x1 = w * c // self.num_cols
-        y1 = h * r // self.num_rows
-        x2 = w * (c + 1) // self.num_cols
-        y2 = h * (r + 1) // self.num_rows
-        return (x1, y1, x2, y2)
 
-    def calculate_center_coords(self, r, c):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        x = int(w * (c + .5)) // self.num_cols
-        y = int(h * (r + .5)) // self.num_rows
-        return (x, y)
-
-    def draw_path_to_state(self, event = None):
-        self.canvas.delete('numbers')
-
-        self.canvas.delete('pieces')
-        self.canvas.delete('numbers')
+        # Persistent canvas items: one oval per cell (recolored, not recreated) and a pool of path numbers
+        self.cell_items : Dict[Tuple[int, int], int] = {}
+        self.cell_fills : Dict[Tuple[int, int], str] = {}
+        self.number_items : List[int] = []
+        self.numbers_shown = 0
+        # The bitboards of the pieces the cell ovals currently show (None before the first draw)
+        self.drawn_bitboards : Optional[Tuple[int, int]] = None
+        super().__init__(master, initial_state, canvas_height = MAX_HEIGHT, canvas_width = MAX_HEIGHT * self.num_cols // self.num_rows , playing_agents = playing_agents)
 
-        # draw pieces
+    def place_cell_items(self):
+        """ Create the cell ovals the first time; afterwards just move them to the current cell coordinates """
+        xs, ys, margin, cell_items = self.xs, self.ys, self.margin, self.cell_items
         for r in range(0,self.num_rows):
             for c in range(0,self.num_cols):
-                piece = self.display_state.get_piece_at(r,c)
-                if piece != TicTacToeGameState.EMPTY:
-                    x1, y1, x2, y2 = self.calculate_box_coords(r,c)
-                    self.canvas.create_oval(x1 + self.margin, y1 + self.margin, x2 - self.margin, y2 - self.margin, fill= COLORS[PIECE[piece]], tag='pieces')
+                box = (xs[c] + margin, ys[r] + margin, xs[c+1] - margin, ys[r+1] - margin)
+                if (r, c) in cell_items:
+                    self.canvas.coords(cell_items[r, c], *box)
+                else:
+                    self.cell_items[r, c] = self.canvas.create_oval(*box, fill= COLORS[EMPTY], tag='empty')
+                    self.cell_fills[r, c] = COLORS[EMPTY]
+
+    def draw_path_to_state(self, event = None):
+        self.measure_canvas(self.num_rows, self.num_cols)
+        if not self.cell_items:
+            self.place_cell_items()
+
+        # color pieces, only visiting the cells whose piece changed since the last draw (every cell the first time)
+        get_piece_at, cell_fills = self.display_state.get_piece_at, self.cell_fills
+        bitboards = self.display_state.bitboards
+        if self.drawn_bitboards is None:
+            cells = list(cell_fills)
+        else:
+            changed = (self.drawn_bitboards[0] ^ bitboards[0]) | (self.drawn_bitboards[1] ^ bitboards[1])
+            cells = [TicTacToeGameState.bit_cell(bit) for bit in bit_indices(changed)]
+        for r, c in cells:
+            fill = PIECE_FILLS[get_piece_at(r,c)]
+            if cell_fills[r, c] != fill:
+                self.canvas.itemconfigure(self.cell_items[r, c], fill = fill)
+                self.cell_fills[r, c] = fill
+        self.drawn_bitboards = bitboards
 
         # draw text for path
         path_coords = [self.calculate_center_coords( *state.last_action ) # r,c coordinates
                         for state in self.display_state.get_path()[1:] ]
 
         for i, pos in enumerate(path_coords): # don't do the first state
-             self.canvas.create_text(pos, fill = COLORS[TEXT], tag = 'numbers',
-                 text = str(i+1), font = ('Times New Roman', self.text_size, 'bold' ))
+            if i < len(self.number_items):
+                self.canvas.coords(self.number_items[i], *pos)
+            else:
+                self.number_items.append(self.canvas.create_text(pos, fill = COLORS[TEXT], tag = 'numbers',
+                    text = str(i+1), font = ('Times New Roman', self.text_size, 'bold' )))
+        for i in range(len(path_coords), self.numbers_shown):
+            self.canvas.itemconfigure(self.number_items[i], state = HIDDEN)
+        for i in range(self.numbers_shown, len(path_coords)):
+            self.canvas.itemconfigure(self.number_items[i], state = NORMAL)
+        self.numbers_shown = len(path_coords)
 
     def draw_background(self, event = None):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        # Clear the background grid frame and empty spots
-        self.canvas.delete('grid_line')
-        self.canvas.delete('frame')
-        self.canvas.delete('empty')
-
+        w, h = self.measure_canvas(self.num_rows, self.num_cols)
         # Draw all the "frame" - really, background color
-        self.canvas.create_rectangle(0, 0, w, h, fill= COLORS[FRAME], tag='frame')
-
-        # Draw all the "empty spots"
-        for r in range(0,self.num_rows):
-            for c in range(0,self.num_cols):
-                piece = self.display_state.get_piece_at(r,c)
-                x1, y1, x2, y2 = self.calculate_box_coords(r,c)
-                self.canvas.create_oval(x1 + self.margin, y1 + self.margin, x2 - self.margin, y2 - self.margin, fill= COLORS[EMPTY], tag='empty')
-
+        self.place_item('frame', self.canvas.create_rectangle, 0, 0, w, h, fill= COLORS[FRAME], tag='frame')
+        self.canvas.tag_lower('frame')
 
-        # Creates all vertical lines
-        for c in range(0, self.num_cols):
-            x = w * c // self.num_cols
-            self.canvas.create_line([(x, 0), (x, h)], tag='grid_line', width = 2)
+        # Move all the cells (empty spots and pieces)
+        self.place_cell_items()
 
-        # Creates all horizontal lines
-        for r in range(0, self.num_rows):
-            y = h * r // self.num_rows
-            self.canvas.create_line([(0, y), (w, y)], tag='grid_line', width = 2)
+        # Creates all grid lines, one canvas item per axis
+        self.draw_grid_lines(w, h, width = 2)
 
     def click_canvas_to_action(self, event) -> TicTacToeAction:
-        w = self.canvas.winfo_width() # Get current width of canvas
-        col = event.x // (w //  self.num_cols)
-        h = self.canvas.winfo_height() # Get current height of canvas
-        row = event.y // (h //  self.num_rows)
+        row, col = self.click_to_cell(event, self.num_rows, self.num_cols)
         return TicTacToeAction(row, col)
 
+    def zobrist_keys(self):
+        return [(r, c, piece) for r in range(self.num_rows) for c in range(self.num_cols) for piece in range(2)]
+
+    def occupied_cells(self, state):
+        for r in range(self.num_rows):
+            for c in range(self.num_cols):
+                if (piece := state.get_piece_at(r,c)) != TicTacToeGameState.EMPTY:
+                    yield (r, c, piece)
+
+    def move_cells(self, state, action):
+        return ((action.row, action.col, state.current_player_index),)
+
 class NimGUI(PlayGameGui):
     def __init__(self, master, initial_state, playing_agents):
         master.title("Nim Search Visualizer")
         self.game_class = NimGameState
         self.num_rows = initial_state.get_num_piles()
-        self.num_cols = max(initial_state.get_stones_in_pile(p) for p in range(self.num_rows))
+        self.num_cols = max(initial_state.get_stones_per_pile())
         height = min(MAX_HEIGHT, self.num_rows * 60)
         self.text_size = height // (self.num_rows * 2)
         self.margin = 5
-        super().__init__(master, initial_state, canvas_height = height, canvas_width = height * self.num_cols // self.num_rows ,playing_agents = playing_agents)
 
-    def calculate_box_coords(self, r, c):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        x1 = w * c // self.num_cols
-        y1 = h * r // self.num_rows
-        x2 = w * (c + 1) // self.num_cols
-        y2 = h * (r + 1) // self.num_rows
-        return (x1, y1, x2, y2)
+        # Persistent canvas items: one oval and one number per stone, reconfigured (not recreated) on every redraw
+        self.stone_items : Dict[Tuple[int, int], Tuple[int, int]] = {}
+        self.stone_looks : Dict[Tuple[int, int], Tuple[Optional[str], str]] = {} # (fill or None if hidden, number text)
+        super().__init__(master, initial_state, canvas_height = height, canvas_width = height * self.num_cols // self.num_rows ,playing_agents = playing_agents)
 
-    def calculate_center_coords(self, r, c):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        x = int(w * (c + .5)) // self.num_cols
-        y = int(h * (r + .5)) // self.num_rows
-        return (x, y)
+    def place_stone_items(self):
+        """ Create the stone ovals and numbers (hidden) the first time; afterwards just move them to the current cell coordinates """
+        xs, ys, margin, stone_items = self.xs, self.ys, self.margin, self.stone_items
+        for r in range(0,self.num_rows):
+            for c in range(0,self.initial_state.get_stones_in_pile(r)):
+                box, center = (xs[c] + margin, ys[r] + margin, xs[c+1] - margin, ys[r+1] - margin), self.calculate_center_coords(r,c)
+                if (r, c) in stone_items:
+                    oval, number = stone_items[r, c]
+                    self.canvas.coords(oval, *box)
+                    self.canvas.coords(number, *center)
+                else:
+                    stone_items[r, c] = (self.canvas.create_oval(*box, fill= COLORS[STONE], state = HIDDEN, tag='pieces'),
+                                        self.canvas.create_text(center, fill = COLORS[TEXT], state = HIDDEN, tag = 'numbers',
+                                            text = '', font = ('Times New Roman', self.text_size, 'bold' )))
+                    self.stone_looks[r, c] = (None, '')
 
     def draw_path_to_state(self, event = None):
-        self.canvas.delete('pieces')
-        self.canvas.delete('numbers')
-        self.canvas.delete('STONE_pieces')
+        self.measure_canvas(self.num_rows, self.num_cols)
+        if not self.stone_items:
+            self.place_stone_items()
 
-        # draw pieces
+        # Work out how every stone should look: remaining stones are plain,
+        # stones taken along the path are colored by who took them and numbered by the move
+        looks = {cell : (None, '') for cell in self.stone_items}
         for r in range(0,self.num_rows):
             for c in range(0,self.display_state.get_stones_in_pile(r)):
-                x1, y1, x2, y2 = self.calculate_box_coords(r,c)
-                self.canvas.create_oval(x1 + self.margin, y1 + self.margin, x2 - self.margin, y2 - self.margin, fill= COLORS[STONE], tag='pieces')
-
-        # draw text and colored ovals for STONE stones along path
+                looks[r, c] = (COLORS[STONE], '')
 
-        # for every action taken
+        # The player who took each stone is the parent's current player,
+        # so the fill indexed by the other player is the one indexed by the state's
         for i, state in enumerate(self.display_state.get_path()[1:]): # don't do the first state
-            rem_stones, pile = state.last_action
-            orig_stones = state.parent.get_stones_in_pile(pile)
-            player = state.parent.current_player_index
-            # draw over each stone
-            for c in range(orig_stones - rem_stones, orig_stones):
-                pos = self.calculate_center_coords(pile,c)
-                x1, y1, x2, y2 = self.calculate_box_coords(pile,c)
-
-                self.canvas.create_oval(x1 + self.margin, y1 + self.margin, x2 - self.margin, y2 - self.margin, fill= COLORS[PIECE[0] if player == 1 else PIECE[1]], tag='STONE_pieces')
-
-                self.canvas.create_text(pos, fill = COLORS[TEXT], tag = 'numbers',
-                     text = str(i+1), font = ('Times New Roman', self.text_size, 'bold' ))
+            look = (PIECE_FILLS[state.current_player_index], str(i+1))
+            pile = state.last_action.pile
+            for c in state.get_taken_stones():
+                looks[pile, c] = look
+
+        # Reconfigure only the stones whose look changed
+        stone_looks, itemconfigure = self.stone_looks, self.canvas.itemconfigure
+        for cell, look in looks.items():
+            if stone_looks[cell] != look:
+                fill, text = look
+                oval, number = self.stone_items[cell]
+                if fill is None:
+                    itemconfigure(oval, state = HIDDEN)
+                else:
+                    itemconfigure(oval, fill = fill, state = NORMAL)
+                itemconfigure(number, text = text, state = NORMAL if text else HIDDEN)
+                stone_looks[cell] = look
 
     def draw_background(self, event = None):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        # Clear the empty spots
-        self.canvas.delete('empty')
+        w, h = self.measure_canvas(self.num_rows, self.num_cols)
         # Draw all the "empty spots"
+        xs, ys, margin, create_oval = self.xs, self.ys, self.margin, self.canvas.create_oval
         for r in range(0,self.num_rows):
+            y1, y2 = ys[r] + margin, ys[r+1] - margin
             for c in range(0,self.initial_state.get_stones_in_pile(r)):
-                pos = self.calculate_center_coords(r,c)
-                x1, y1, x2, y2 = self.calculate_box_coords(r,c)
-                self.canvas.create_oval(x1 + self.margin, y1 + self.margin, x2 - self.margin, y2 - self.margin,  fill= '', outline = COLORS[STONE], width = 2, dash = (4,4), tag='empty')
+                self.place_item(('empty', r, c), create_oval, xs[c] + margin, y1, xs[c+1] - margin, y2,
+                    fill= '', outline = COLORS[STONE], width = 2, dash = (4,4), tag='empty')
+        self.canvas.tag_lower('empty')
+
+        # Move all the stones and their numbers
+        self.place_stone_items()
 
 
     def click_canvas_to_action(self, event) -> NimAction:
-        w = self.canvas.winfo_width() # Get current width of canvas
-        col = event.x // (w //  self.num_cols)
-        h = self.canvas.winfo_height() # Get current height of canvas
-        row = event.y // (h //  self.num_rows)
+        row, col = self.click_to_cell(event, self.num_rows, self.num_cols)
         # print('clicked {}'.format(col))
         pile = row
         rem_stones = self.current_state.get_stones_in_pile(pile) - col
         return NimAction(rem_stones, pile)
 
+    def zobrist_keys(self):
+        return [(r, c) for r in range(self.num_rows) for c in range(self.initial_state.get_stones_in_pile(r))]
+
+    def occupied_cells(self, state):
+        for r in range(self.num_rows):
+            for c in range(state.get_stones_in_pile(r)):
+                yield (r, c)
+
+    def move_cells(self, state, action):
+        stones = state.get_stones_in_pile(action.pile)
+        return [(action.pile, c) for c in range(stones - action.stones, stones)]
+
 
 class ConnectFourGUI(PlayGameGui):
     def __init__(self, master, initial_state, playing_agents):
@@ -734,83 +1034,99 @@ class ConnectFourGUI(PlayGameGui):
         self.num_cols = ConnectFourGameState.num_cols
         self.text_size = MAX_HEIGHT // (self.num_rows * 2)
         self.margin = MAX_HEIGHT // (self.num_rows * 10)
-        super().__init__(master, initial_state, canvas_height = MAX_HEIGHT, canvas_width = MAX_HEIGHT * self.num_cols // self.num_rows, playing_agents = playing_agents)
 
-    def calculate_box_coords(self, r, c):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        x1 = w * c // self.num_cols
-        y1 = h * r // self.num_rows
-        x2 = w * (c + 1) // self.num_cols
-        y2 = h * (r + 1) // self.num_rows
-        return (x1, y1, x2, y2)
-
-    def calculate_center_coords(self, r, c):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        x = int(w * (c + .5)) // self.num_cols
-        y = int(h * (r + .5)) // self.num_rows
-        return (x, y)
+        # The frame, empty spots and grid lines are drawn as a single image; RGB bytes for each of their colors
+        self.board_rgb = (color_rgb(master, COLORS[FRAME]), color_rgb(master, COLORS[EMPTY]), color_rgb(master, 'black'))
+        self.board_img = None
+        self.board_img_size = None
+        super().__init__(master, initial_state, canvas_height = MAX_HEIGHT, canvas_width = MAX_HEIGHT * self.num_cols // self.num_rows, playing_agents = playing_agents)
 
     def draw_path_to_state(self, event = None):
-        self.canvas.delete('numbers')
-
+        self.measure_canvas(self.num_rows, self.num_cols)
         self.canvas.delete('pieces')
         self.canvas.delete('numbers')
 
-        # draw pieces
-        for r in range(0,self.num_rows):
-            for c in range(0,self.num_cols):
-                piece = self.display_state.get_piece_at(r,c)
-                if piece != ConnectFourGameState.EMPTY:
-                    pos = self.calculate_center_coords(r,c)
-                    x1, y1, x2, y2 = self.calculate_box_coords(r,c)
-                    self.canvas.create_oval(x1 + self.margin, y1 + self.margin, x2 - self.margin, y2 - self.margin, fill= COLORS[PIECE[piece]], tag='pieces')
+        # draw pieces, visiting only the occupied cells of each player's bitboard
+        xs, ys, margin, create_oval = self.xs, self.ys, self.margin, self.canvas.create_oval
+        for piece, bitboard in enumerate(self.display_state.bitboards):
+            for bit in bit_indices(bitboard):
+                r, c = ConnectFourGameState.bit_cell(bit)
+                create_oval(xs[c] + margin, ys[r] + margin, xs[c+1] - margin, ys[r+1] - margin, fill= PIECE_FILLS[piece], tag='pieces')
 
-        # draw text for path
-        path_coords = [self.calculate_center_coords(
-                        self.num_rows -  state.get_column_height(state.last_action.column) ,state.last_action.column ) # r,c coordinates
-                        for state in self.display_state.get_path()[1:] ]
-
-        for i, pos in enumerate(path_coords): # don't do the first state
-             self.canvas.create_text(pos, fill = COLORS[TEXT], tag = 'numbers',
-                 text = str(i+1), font = ('Times New Roman', self.text_size, 'bold' ))
+        # draw text for path, walking it once
+        for i, state in enumerate(self.display_state.get_path()[1:]): # don't do the first state
+            pos = self.calculate_center_coords(self.num_rows -  state.get_column_height(state.last_action.column), state.last_action.column) # r,c coordinates
+            self.canvas.create_text(pos, fill = COLORS[TEXT], tag = 'numbers',
+                text = str(i+1), font = ('Times New Roman', self.text_size, 'bold' ))
 
     def draw_background(self, event = None):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        # Clear the background grid frame and empty spots
-        self.canvas.delete('grid_line')
-        self.canvas.delete('frame')
-        self.canvas.delete('empty')
-
-        # Draw all the "frame" - really, background color
-        self.canvas.create_rectangle(0, 0, w, h, fill= COLORS[FRAME], tag='frame')
+        w, h = self.measure_canvas(self.num_rows, self.num_cols)
+        # Draw the "frame" - really, background color - with its empty spots and grid lines as one image,
+        # only rebuilt when the canvas size changes
+        board_item = self.place_item('frame', self.canvas.create_image, 0, 0, anchor = NW, tag='frame')
+        if self.board_img_size != (w, h):
+            self.board_img = PhotoImage(data = self.board_ppm(w, h))
+            self.board_img_size = (w, h)
+            self.canvas.itemconfigure(board_item, image = self.board_img)
+        self.canvas.tag_lower('frame')
+
+    def board_ppm(self, w, h) -> bytes:
+        """ Binary PPM image of the empty board at the given canvas size (as last measured by measure_canvas).
+        Each pixel row is assembled from runs of frame, outline and empty-spot color, one run per oval edge. """
+        frame, empty, line = self.board_rgb
+        xs, ys, margin = self.xs, self.ys, self.margin
+        # Grid lines are 2 pixels wide, on the top/left edge of every cell
+        line_ys = {y for r in range(self.num_rows) for y in (ys[r] - 1, ys[r])}
+        line_xs = [x for c in range(self.num_cols) for x in (xs[c] - 1, xs[c]) if x >= 0]
+        ovals = [((xs[c] + xs[c+1]) / 2, (xs[c+1] - xs[c]) / 2 - margin) for c in range(self.num_cols)] # center x, x radius
+
+        pixels = bytearray()
+        for r in range(self.num_rows):
+            cy, b = (ys[r] + ys[r+1]) / 2, (ys[r+1] - ys[r]) / 2 - margin # center y, y radius
+            for y in range(ys[r], ys[r+1]):
+                if y in line_ys:
+                    pixels += line * w
+                    continue
+                runs, x = [], 0
+                dy = (y + .5 - cy) / b if b > 1 else 1
+                if abs(dy) < 1:
+                    dy_inner = (y + .5 - cy) / (b - 1)
+                    for cx, a in ovals:
+                        if a <= 1:
+                            continue
+                        half = a * sqrt(1 - dy * dy)
+                        left, right = round(cx - half), round(cx + half)
+                        if abs(dy_inner) < 1:
+                            half = (a - 1) * sqrt(1 - dy_inner * dy_inner)
+                            inner_left, inner_right = max(left, round(cx - half)), min(right, round(cx + half))
+                        else:
+                            inner_left = inner_right = left
+                        runs += (frame * (left - x), line * (inner_left - left), empty * (inner_right - inner_left), line * (right - inner_right))
+                        x = right
+                runs.append(frame * (w - x))
+                pixel_row = bytearray(b''.join(runs))
+                for x in line_xs:
+                    pixel_row[3 * x : 3 * x + 3] = line
+                pixels += pixel_row
+        return ppm_header(w, h) + bytes(pixels)
 
-        # Draw all the "empty spots"
-        for r in range(0,self.num_rows):
-            for c in range(0,self.num_cols):
-                piece = self.display_state.get_piece_at(r,c)
-                pos = self.calculate_center_coords(r,c)
-                x1, y1, x2, y2 = self.calculate_box_coords(r,c)
-                self.canvas.create_oval(x1 + self.margin, y1 + self.margin, x2 - self.margin, y2 - self.margin, fill= COLORS[EMPTY], tag='empty')
-
-
-        # Creates all vertical lines
-        for c in range(0, self.num_cols):
-            x = w * c // self.num_cols
-            self.canvas.create_line([(x, 0), (x, h)], tag='grid_line', width = 2)
+    def click_canvas_to_action(self, event) -> ConnectFourAction:
+        row, col = self.click_to_cell(event, self.num_rows, self.num_cols)
+        return ConnectFourAction(col)
 
-        # Creates all horizontal lines
-        for r in range(0, self.num_rows):
-            y = h * r // self.num_rows
-            self.canvas.create_line([(0, y), (w, y)], tag='grid_line', width = 2)
+    def zobrist_keys(self):
+        return [(r, c, piece) for r in range(self.num_rows) for c in range(self.num_cols) for piece in range(2)]
 
+    def occupied_cells(self, state):
+        for r in range(self.num_rows):
+            for c in range(self.num_cols):
+                if (piece := state.get_piece_at(r,c)) != ConnectFourGameState.EMPTY:
+                    yield (r, c, piece)
 
-    def click_canvas_to_action(self, event) -> ConnectFourAction:
-        w = self.canvas.winfo_width() # Get current width of canvas
-        col = event.x // (w //  self.num_cols)
-        return ConnectFourAction(col)
+    def move_cells(self, state, action):
+        # The piece lands on top of the column
+        r = self.num_rows - state.get_column_height(action.column) - 1
+        return ((r, action.column, state.current_player_index),)
 
 
 
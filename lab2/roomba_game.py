@@ -1,6 +1,5 @@
 from __future__ import annotations
 from typing import Optional, Any, Hashable, Sequence, Iterable, NamedTuple, List, Tuple, TypeVar
-from copy import deepcopy
 from gamesearch_problem import StateNode, Action
 
 Terrain = TypeVar('Terrain', bound=str)
@@ -9,6 +8,7 @@ Terrain = TypeVar('Terrain', bound=str)
 FLOOR : Terrain = '.'
 WALL : Terrain = '#'
 CLEANED : Terrain = '%'
+CLEANED_BYTE : bytes = CLEANED.encode()
 
 """
 An abstract framework for the game of RoombaRace, based on the 
@@ -32,6 +32,8 @@ NEIGHBORING_STEPS : Dict[Coordinate, str] = {Coordinate(-1,0): "North", Coordina
 class RoombaRaceAction(Coordinate, Action):
     """ Representing the *relative* coordinate a Roomba is trying to move to - that is, the 
     number of rows down and columns right the roomba is trying to move from its current position. """
+    __slots__ = ()
+
     def __str__(self):
         return NEIGHBORING_STEPS[self]
 
@@ -46,6 +48,22 @@ class RoombaRaceAction(Coordinate, Action):
         except KeyError:
             return None
 
+# The four possible moves, in the same order as NEIGHBORING_STEPS
+NEIGHBORING_ACTIONS : Tuple[RoombaRaceAction, ...] = tuple(RoombaRaceAction(*step) for step in NEIGHBORING_STEPS)
+
+# (width, height) -> for each flat cell index, the in-bounds (action, neighbor index) pairs
+NEIGHBOR_TABLES : Dict[Tuple[int, int], List[Tuple[Tuple[RoombaRaceAction, int], ...]]] = {}
+
+def neighbor_table(width : int, height : int) -> List[Tuple[Tuple[RoombaRaceAction, int], ...]]:
+    """ Returns the table of in-bounds moves from each cell of a width x height grid,
+    built once per grid size so move generation needs no bounds checks """
+    if (table := NEIGHBOR_TABLES.get((width, height))) is None:
+        table = NEIGHBOR_TABLES[width, height] = [
+            tuple((action, (r + action.r) * width + c + action.c) for action in NEIGHBORING_ACTIONS
+                if 0 <= r + action.r < height and 0 <= c + action.c < width)
+            for r in range(height) for c in range(width)]
+    return table
+
 
 """
 A StateNode representation of the game RoombaRace.
@@ -59,8 +77,13 @@ class RoombaRaceGameState(StateNode):
 
 
     """ Instance Variables """
-    grid : List[List[Terrain]]
+    grid : bytes # row-major, one byte per cell
+    width : int
     positions : List[Coordinate]
+    legal_actions : Optional[Tuple[RoombaRaceAction, ...]]
+    features : Optional[Hashable]
+
+    __slots__ = ('grid', 'width', 'positions', 'legal_actions', 'features')
 
     """
     A 'static' method that reads data from a text file and returns
@@ -80,13 +103,14 @@ class RoombaRaceGameState(StateNode):
             init_r_1, init_c_1 = [int(x) for x in file.readline().split()]
             init_r_2, init_c_2 = [int(x) for x in file.readline().split()]
             for i in range(num_rows):
-                row = list(file.readline().strip()) # or file.readline().split()
+                row = file.readline().strip() # or file.readline().split()
                 assert (len(row) == num_cols)
                 grid.append(row) 
-            # grid is a list of lists - a 2d grid!
+            # grid is packed into a single row-major bytes - a 2d grid, flattened!
 
         return RoombaRaceGameState(positions = [Coordinate(init_r_1, init_c_1),Coordinate(init_r_2, init_c_2)],
-                            grid = grid,
+                            grid = ''.join(grid).encode(),
+                            width = num_cols,
                             parent = None,
                             depth = 0,
                             last_action = None,
@@ -103,7 +127,8 @@ class RoombaRaceGameState(StateNode):
         The default is an empty board, player index 0 (player number 1, name "Red")
         """
         return RoombaRaceGameState(positions = [(2, 1),(2, 5)],
-                            grid =  [[ FLOOR for c in range(7)] for r in range(5)],
+                            grid = FLOOR.encode() * (5 * 7),
+                            width = 7,
                             parent = None,
                             depth = 0,
                             last_action = None,
@@ -113,7 +138,8 @@ class RoombaRaceGameState(StateNode):
    
     def __init__(self, 
                 positions : List[Coordinate],
-                grid : List[List[Terrain]],
+                grid : bytes,
+                width : int,
                 parent : Optional[RoombaRaceGameState], 
                 last_action: Optional[Action], 
                 depth : int, 
@@ -123,7 +149,8 @@ class RoombaRaceGameState(StateNode):
         Takes:
 
         positions: a list of Coordinates representing the positions of the players.
-        grid: a list of lists representing a grid of Terrain objects, the current status of the environment
+        grid: a bytes object holding the grid of Terrain row by row, one byte per cell - the current status of the environment
+        width: the number of columns in the grid
 
         parent: the preceding RoombaGameState along the path taken to reach the state
                 (the initial state's parent should be None)
@@ -135,6 +162,9 @@ class RoombaRaceGameState(StateNode):
         """
         self.positions = positions
         self.grid = grid
+        self.width = width
+        self.legal_actions : Optional[Tuple[RoombaRaceAction, ...]] = None # computed on first request
+        self.features : Optional[Hashable] = None # computed on first request
         super().__init__(parent=parent,
             last_action=last_action,
             depth=depth,
@@ -154,13 +184,19 @@ class RoombaRaceGameState(StateNode):
         In the case of RoombaRaceGameState, the features are the positions of the Roombas and the state of the grid.
 
         NOTE: In this case,the current player IS implicitly encoded in the features.
+
+        The features are built once per state and then reused.
         """
-        return (tuple(tuple(pos) for pos in self.positions), tuple(tuple(row) for row in self.grid) )
+        if self.features is None:
+            # Both positions packed into one int, as flat cell indices
+            (r0, c0), (r1, c1) = self.positions
+            self.features = (((r0 * self.width + c0) << 16) | (r1 * self.width + c1), self.grid)
+        return self.features
 
 
     def __str__(self) -> str:
         """Return a string representation of the state."""
-        s = "\n".join(["".join(row) for row in self.grid])
+        s = "\n".join(["".join(row) for row in self.get_grid()])
         for i,p in enumerate(RoombaRaceGameState.player_names):
             r,c = self.get_position(i)
             str_pos =  r * (self.get_width()+1) + c
@@ -173,7 +209,7 @@ class RoombaRaceGameState(StateNode):
 
     def is_endgame_state(self) -> bool:
         """Returns whether or not this state is an endgame state (terminal)"""
-        return len(self.get_all_actions()) == 0
+        return not self.get_all_actions()
 
 
     def endgame_utility(self, player_index : int) -> Optional[float]:
@@ -208,8 +244,19 @@ class RoombaRaceGameState(StateNode):
         """
         Return all legal actions from this state. Actions may be whatever type you wish.
         Note that the ordering may matter for the algorithm (e.g. Alpha-Beta pruning).
+
+        The actions are computed once per state and then reused, since the state never changes.
+        Each call still returns a fresh list, since callers may reorder it.
         """
-        return  [RoombaRaceAction(*a) for a in NEIGHBORING_STEPS if self.is_legal_action(a)] 
+        if self.legal_actions is None:
+            # Same checks as is_legal_action, on flat cell indices: the table has already done the bounds checks
+            grid, width = self.grid, self.width
+            my_r, my_c = self.positions[self.current_player_index]
+            (r0, c0), (r1, c1) = self.positions
+            occupied0, occupied1, floor = r0 * width + c0, r1 * width + c1, ord(FLOOR)
+            self.legal_actions = tuple(action for action, i in neighbor_table(width, len(grid) // width)[my_r * width + my_c]
+                                    if grid[i] == floor and i != occupied0 and i != occupied1)
+        return list(self.legal_actions)
 
 
 
@@ -219,20 +266,21 @@ class RoombaRaceGameState(StateNode):
 
         -- action is assumed legal (is_legal_action called before), but a ValueError may be passed for illegal actions if desired.
         """
-        new_grid = deepcopy(self.grid)
-
         dr, dc = action
         my_r, my_c = self.get_position(self.current_player_index)
         new_r, new_c = my_r + dr, my_c + dc
 
-        new_grid[my_r][my_c] = CLEANED
+        # Splice the cleaned cell into a new grid; cheaper than a bytearray round trip
+        i = my_r * self.width + my_c
+        new_grid = self.grid[:i] + CLEANED_BYTE + self.grid[i + 1:]
 
-        new_positions = deepcopy(self.positions)
+        new_positions = list(self.positions)
         new_positions[self.current_player_index] = (new_r, new_c)
         
         return RoombaRaceGameState (
             positions = new_positions,
             grid = new_grid,
+            width = self.width,
             parent = self,
             depth = self.depth + 1,
             last_action = action,
@@ -246,16 +294,21 @@ class RoombaRaceGameState(StateNode):
 
     def get_width(self) -> int:
         """Returns the width (number of cols) of the maze"""
-        return len(self.grid[0])
+        return self.width
 
 
     def get_height(self) -> int:
         """Returns the height (number of rows) of the maze"""
-        return len(self.grid)
+        return len(self.grid) // self.width
 
     
     def get_grid(self) -> List[List[Terrain]]:
         """ Returns a 2d-list grid of the maze. """
+        text, w = self.grid.decode(), self.width
+        return [list(text[i:i + w]) for i in range(0, len(text), w)]
+
+    def get_grid_bytes(self) -> bytes:
+        """ Returns the maze as one row-major bytes object, one byte per cell. """
         return self.grid
 
     def is_inbounds(self, coord : Coordinate) -> bool:
@@ -268,6 +321,6 @@ class RoombaRaceGameState(StateNode):
 
     def get_terrain(self, coord : Coordinate) -> Terrain:
         """ Return the kind of terrain at coord """
-        return self.grid[coord.r][coord.c]
+        return chr(self.grid[coord.r * self.width + coord.c])
 
 
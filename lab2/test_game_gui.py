@@ -8,12 +8,17 @@ Usage:
     INITIAL_STATE_FILE is a path to a text file or 'default'
 """
 from __future__ import annotations
-from typing import Optional, Any, Hashable, Sequence, List, Tuple, Callable
+from typing import Optional, Any, Hashable, Sequence, Iterable, List, Dict, Set, Tuple, Callable
 
 
 from traceback import format_exc
 from sys import argv
+import sys
 import time
+from concurrent.futures import Future
+from threading import Condition, Thread
+from contextlib import redirect_stdout
+from io import StringIO
 
 from math import sqrt
 from tkinter import * # Tk, Canvas, Frame, Listbox, Button, Checkbutton, IntVar, StringVar, Spinbox, Label
@@ -27,10 +32,12 @@ from tictactoe_game import TicTacToeGameState, TicTacToeAction
 from nim_game import NimGameState, NimAction
 from roomba_game import RoombaRaceGameState, RoombaRaceAction, Coordinate, Terrain, FLOOR, WALL, CLEANED
 
-all_fn_dicts = { RoombaRaceGameState: roomba_functions,
-    ConnectFourGameState: connectfour_functions,
-    TicTacToeGameState: tictactoe_functions,
-    NimGameState: nim_functions}
+# Each game's evaluation functions, by name, as an attribute of its state class
+RoombaRaceGameState.eval_functions = roomba_functions
+ConnectFourGameState.eval_functions = connectfour_functions
+TicTacToeGameState.eval_functions = tictactoe_functions
+NimGameState.eval_functions = nim_functions
+
 ### GUI too big? Change this number
 MAX_HEIGHT = 350
 
@@ -48,6 +55,16 @@ COLORS = {FLOOR : 'green', WALL : 'gray25', CLEANED : 'white',
           PIECE[0]: 'red', PIECE[1]: 'yellow', FRAME: 'blue',EMPTY: 'white' , TEXT: 'black',
           STONE : 'grey'}
 
+# Colors as tables indexed by what the draw loops have at hand, rather than looked up by key name
+# Piece colors indexed by piece number (tic-tac-toe, connectfour); EMPTY (-1) indexes the last entry
+PIECE_FILLS = (COLORS[PIECE[0]], COLORS[PIECE[1]], COLORS[EMPTY])
+# Roomba colors indexed by player, and terrain colors indexed by byte code in a flattened maze
+AGENT_FILLS = (COLORS[AGENT[0]], COLORS[AGENT[1]])
+PATH_FILLS = (COLORS[PATH[0]], COLORS[PATH[1]])
+TERRAIN_CODES = {ord(terrain) : terrain for terrain in (FLOOR, WALL, CLEANED)}
+# Fill of each terrain type, indexed by its byte code
+TERRAIN_FILLS = [COLORS[TERRAIN_CODES[code]] if code in TERRAIN_CODES else None for code in range(256)]
+
 
 AGENT_NAMES =  ["Random" , "Reflex", "MaxDFS", "Minimax", "Expectimax", "AlphaBeta", "MoveOrderingAlphaBeta", "MCTS"]
 
@@ -60,12 +77,130 @@ ITERATIVE_SEARCH_AGENTS = {"MaxDFS" : IDMaximizingSearchAgentWrapper, "Minimax":
 
 ASSYMETRIC_AGENTS = {"MCTS": MonteCarloTreeSearchAgentWrapper}
 
+# What each agent supports, as bit flags worked out once per name
+CAP_ITER, CAP_ASYM, CAP_SEARCH = 1, 2, 4
+AGENT_CAPS = {name : (CAP_ITER if name in ITERATIVE_SEARCH_AGENTS else 0)
+                    | (CAP_ASYM if name in ASSYMETRIC_AGENTS else 0)
+                    | (CAP_SEARCH if name in SEARCH_AGENTS else 0)
+                for name in AGENT_NAMES}
+
+# How each kind of agent is built: its wrappers by name, the parameters it is given, and a prefix for its name.
+# An agent's kind is the first of CAP_ASYM, CAP_ITER, CAP_SEARCH in the caps it searches with (0 for the basic agents).
+AGENT_FACTORIES = {
+    CAP_ASYM : (ASSYMETRIC_AGENTS, ('player_index', 'exploration_bias', 'time_limit', 'show_thinking', 'verbose'), ""),
+    CAP_ITER : (ITERATIVE_SEARCH_AGENTS, ('player_index', 'evaluation_fn', 'time_limit', 'show_thinking', 'plateau_cutoff',
+                                          'verbose', 'super_verbose', 'super_super_verbose', 't_table'), "ID "),
+    CAP_SEARCH : (SEARCH_AGENTS, ('player_index', 'evaluation_fn', 'depth_limit', 'verbose', 'show_thinking', 't_table'), ""),
+    0 : (BASIC_AGENTS, ('player_index', 'evaluation_fn', 'verbose'), ""),
+}
+
+# The search counters shown for each kind of agent, formatted with the wrapped agent
+COUNTER_FORMATS = {
+    CAP_ASYM : 'This search || Rollouts performed: {0.total_rollouts}',
+    CAP_ITER : 'This search || Max Depth: {0.depth_limit} | Nodes seen: {0.total_nodes} | Leaf evals: {0.total_evals}',
+    CAP_SEARCH : 'This search || Nodes seen: {0.total_nodes} | Leaf evals: {0.total_evals}',
+    0 : '',
+}
+
 
 STEP_TIME_OPTIONS = (0.00, 0.01, 0.02, 0.03, 0.04, 0.05, 0.06, 0.07, 0.08, 0.09,
                     0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 2.0, 5.0)
 
 CUTOFF_OPTIONS = tuple( ['INF'] + list(range(1,100)))
 
+def set_spinbox(spinbox : Spinbox, value : str):
+    """ Replace the text of a spinbox, rather than stepping through its values until it shows value
+    (which never ends if value isn't one of them, e.g. something the user typed) """
+    spinbox.delete(0, END)
+    spinbox.insert(0, value)
+
+def parse_number(text : str, number_type : Callable[[str], Any] = float) -> Optional[float]:
+    """ The number typed in a setting ('INF' for no limit), or None if it isn't a valid number_type """
+    if text == 'INF':
+        return INF
+    try:
+        return number_type(text)
+    except ValueError:
+        return None
+
+def color_rgb(master : Tk, color : str) -> bytes:
+    """ The 3 RGB bytes of a Tk color name, for building PPM images """
+    return bytes(v >> 8 for v in master.winfo_rgb(color))
+
+def ppm_header(w : int, h : int) -> bytes:
+    return b'P6\n%d %d\n255\n' % (w, h)
+
+def bit_indices(bits : int) -> Iterable[int]:
+    """ The index of every set bit of bits (e.g. the cells of a bitboard), lowest first """
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+def run_on_daemon_thread(fn : Callable, *args) -> Future:
+    """ Start fn(*args) on a daemon thread, returning a Future for its result (or exception).
+    Unlike executor threads, it isn't joined when the program exits, so a search still running then can't keep it alive. """
+    future = Future()
+    def run():
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+    Thread(target=run, daemon=True).start()
+    return future
+
+class OutputBuffer:
+    """ File-like object that collects console output (from any thread), to be written out in one go """
+    def __init__(self):
+        self.chunks : List[str] = []
+
+    def write(self, text : str) -> int:
+        self.chunks.append(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def write_to(self, stream):
+        """ Write everything collected so far to stream with a single write. 
+        Only the chunks that were joined are removed, so writes racing with this one are kept for next time. """
+        if n := len(self.chunks):
+            stream.write(''.join(self.chunks[:n]))
+            del self.chunks[:n]
+            stream.flush()
+
+# Backslash-escapes for every character that means something to Tcl inside a word
+TCL_WORD_ESCAPES = str.maketrans({**{c : '\\' + c for c in '\\{}[]$";# '}, '\n' : '\\n', '\r' : '\\r', '\t' : '\\t'})
+
+def tcl_word(value : Any) -> str:
+    """ str(value) as exactly one Tcl word, whatever characters it holds """
+    return str(value).translate(TCL_WORD_ESCAPES) or '{}'
+
+class CanvasScript:
+    """ Canvas coords/itemconfigure commands collected into one Tcl script, 
+    so a redraw makes a single call into Tcl rather than one per item.
+    Every argument is quoted with tcl_word, so any text (e.g. a player name) is passed through as is. """
+    def __init__(self, canvas : Canvas):
+        self.canvas_name = tcl_word(canvas)
+        self.canvas = canvas
+        self.commands : List[str] = []
+
+    def coords(self, item : int, *coords):
+        self.commands.append(' '.join((self.canvas_name, 'coords', tcl_word(item), *map(tcl_word, coords))))
+
+    def itemconfigure(self, item : int, **options):
+        self.commands.append(' '.join((self.canvas_name, 'itemconfigure', tcl_word(item),
+                                        *('-{} {}'.format(option, tcl_word(value)) for option, value in options.items()))))
+
+    def run(self):
+        if self.commands:
+            self.canvas.tk.eval('\n'.join(self.commands))
+            self.commands.clear()
+
+# While an agent searches, the GUI repaints its progress this often (~30 fps)
+CALLBACK_PAINT_INTERVAL = 1 / 30
+
 INITIAL_WAITING = 0
 SEARCHING_RUNNING = 1
 SEARCHING_PAUSED = 2
@@ -79,7 +214,8 @@ FINISHED_NO_RESULT = 11
 SEARCH_ERROR = -1
 
 
-VALID_STATUS_TRANSITIONS = {
+# Statuses reachable from each status, as sets for the membership test on every transition
+VALID_STATUS_TRANSITIONS = {status : frozenset(next_statuses) for status, next_statuses in {
     None: (INITIAL_WAITING,),
     INITIAL_WAITING : (SEARCHING_RUNNING, SEARCHING_PAUSED, SEARCHING_STEP),
     SEARCHING_RUNNING : (SEARCHING_PAUSED, SEARCHING_STEP, TERMINATING_EARLY, FINISHED_COMPLETE, FINISHED_NO_RESULT, SEARCH_ERROR, INITIAL_WAITING),
@@ -90,6 +226,66 @@ VALID_STATUS_TRANSITIONS = {
     FINISHED_COMPLETE_DISP_LEAF : (FINISHED_COMPLETE,INITIAL_WAITING),
     FINISHED_NO_RESULT : (INITIAL_WAITING,),
     SEARCH_ERROR : tuple()
+}.items()}
+
+# Widget options set on entering each status; options not listed keep their previous value
+SEARCHING_UI = {'restart_button' : {'state' : DISABLED, 'bg' : 'grey'},
+                'undo_move_button' : {'state' : DISABLED, 'bg' : 'grey'},
+                'history_button' : {'state' : DISABLED, 'bg' : 'grey'},
+                'reset_button' : {'state' : NORMAL, 'text' : 'Terminate Search', 'bg' : 'red'},
+                # Cannot choose new algorithm settings
+                'depth_limit_plateau_cutoff_spinbox' : {'state' : DISABLED},
+                'time_limit_spinbox' : {'state' : DISABLED},
+                'agent_listbox' : {'state' : DISABLED},
+                'eval_fn_listbox' : {'state' : DISABLED},
+                'iterative_deepening_checkbox' : {'state' : DISABLED},
+                'keep_tt_checkbox' : {'state' : DISABLED},
+                'exploration_bias_label' : {'state' : DISABLED},
+                'exploration_bias_label_2' : {'state' : DISABLED},
+                'exploration_bias_entry' : {'state' : DISABLED},
+                'step_button' : {'state' : NORMAL},
+                'print_path_states_button' : {'state' : NORMAL, 'text' : "Print Current Search Path"},
+                'fly_blind_search_button' : {'state' : DISABLED, 'bg' : 'grey'}}
+
+STATUS_UI_TABLE = {
+    INITIAL_WAITING : {'restart_button' : {'state' : NORMAL, 'bg' : 'orange red'},
+                       'undo_move_button' : {'state' : NORMAL, 'bg' : 'DodgerBlue2'},
+                       'history_button' : {'state' : NORMAL, 'bg' : 'orchid1'},
+                       'reset_button' : {'state' : DISABLED, 'text' : 'Terminate Search', 'bg' : 'grey'},
+                       # Can choose new algorithm settings
+                       'depth_limit_plateau_cutoff_spinbox' : {'state' : NORMAL},
+                       'time_limit_spinbox' : {'state' : NORMAL},
+                       'agent_listbox' : {'state' : NORMAL},
+                       'eval_fn_listbox' : {'state' : NORMAL},
+                       'iterative_deepening_checkbox' : {'state' : NORMAL},
+                       'keep_tt_checkbox' : {'state' : NORMAL},
+                       'exploration_bias_label' : {'state' : NORMAL},
+                       'exploration_bias_label_2' : {'state' : NORMAL},
+                       'exploration_bias_entry' : {'state' : NORMAL},
+                       'run_pause_button' : {'state' : NORMAL, 'text' : 'Start Search', 'bg' : 'green'},
+                       'step_button' : {'state' : NORMAL, 'text' : 'Step Search', 'bg' : 'yellow'},
+                       'print_path_states_button' : {'state' : DISABLED, 'text' : "Print Current Search Path"},
+                       'fly_blind_search_button' : {'state' : NORMAL, 'bg' : 'VioletRed1'}},
+    SEARCHING_RUNNING : {**SEARCHING_UI, 'run_pause_button' : {'state' : NORMAL, 'text' : 'Pause Search', 'bg' : 'orange'}},
+    SEARCHING_PAUSED : {**SEARCHING_UI, 'run_pause_button' : {'state' : NORMAL, 'text' : 'Continue Search', 'bg' : 'green'}},
+    SEARCHING_STEP : {**SEARCHING_UI, 'run_pause_button' : {'state' : NORMAL, 'text' : 'Continue Search', 'bg' : 'green'}},
+    TERMINATING_EARLY : {'reset_button' : {'state' : DISABLED},
+                        'run_pause_button' : {'state' : DISABLED},
+                        'step_button' : {'state' : DISABLED},
+                        'print_path_states_button' : {'state' : DISABLED}},
+    FINISHED_COMPLETE : {'reset_button' : {'state' : NORMAL, 'text' : 'Discard Search', 'bg' : 'red'},
+                        'run_pause_button' : {'state' : NORMAL, 'text' : 'Play Best Move', 'bg' : 'green'},
+                        'step_button' : {'text' : 'Show Expected Path'}, # enabled only if there is an expected leaf
+                        'print_path_states_button' : {'state' : NORMAL, 'text' : "Print Expected Path"}},
+    FINISHED_COMPLETE_DISP_LEAF : {'step_button' : {'state' : NORMAL, 'text' : 'Show Best Move'}},
+    FINISHED_NO_RESULT : {'reset_button' : {'state' : NORMAL, 'text' : 'Discard Search'},
+                        'run_pause_button' : {'state' : DISABLED, 'text' : 'Play Best Move', 'bg' : 'grey'},
+                        'step_button' : {'state' : DISABLED, 'text' : 'Show Expected Path'},
+                        'print_path_states_button' : {'state' : DISABLED, 'text' : "Print Expected Path"}},
+    SEARCH_ERROR : {widget_name : {'state' : DISABLED} for widget_name in
+                        ('restart_button', 'undo_move_button', 'history_button', 'reset_button',
+                        'depth_limit_plateau_cutoff_spinbox', 'time_limit_spinbox', 'agent_listbox', 'eval_fn_listbox', 'iterative_deepening_checkbox', 'keep_tt_checkbox',
+                        'run_pause_button', 'step_button', 'print_path_states_button', 'fly_blind_search_button')},
 }
 
 STATUS_TEXT = { INITIAL_WAITING: "P{} [{}]'s turn: Pick an agent or click to input a move.",
@@ -104,6 +300,9 @@ STATUS_TEXT = { INITIAL_WAITING: "P{} [{}]'s turn: Pick an agent or click to inp
                 }
 
 class TestGameGui:
+    # Canvas size from the last measure_canvas, None until first measured
+    _canvas_size : Optional[Tuple[int, int]] = None
+
     def __init__(self, master, initial_state:StateNode, canvas_height, canvas_width, eval_fn_dict : Dict[str, Callable[[StateNode, int], float]]):
         self.master = master
 
@@ -119,12 +318,28 @@ class TestGameGui:
         self.eval_fn_dict = eval_fn_dict
 
         self.search_start_time = None
+        self.step_time = 0.1
+
+        # Searches run on a worker thread, which must not touch Tk. It only reads plain attributes (status, step_time)
+        # and posts its latest step in _callback_step for the main thread to paint.
+        self._closed = False # set when the window is closed, to leave the search (and the program)
+        self._callback_step : Optional[Tuple[StateNode, float, Optional[str]]] = None
+        self._step_taken = False # set by the worker after a single step, for the main thread to pause the search
+        self._status_changed = Condition() # notified when status or _step_taken changes, so the worker waits without polling
+        self._search_output = OutputBuffer() # console output while searching, written out once per repaint
 
         self.current_agent : AgentWrapper = None
+        self.search_params : Dict[str, Any] = {} # parameters parsed by verify_parameters, for run_search
 
+        # Background canvas items that are created once and only moved when the canvas is resized
+        self.static_items : Dict[Hashable, int] = {}
+        # The (display_state, current_state) last drawn by visualize_state, to skip redrawing the same picture
+        self.drawn_states : Optional[Tuple[StateNode, StateNode]] = None
 
         #########################################################################################
 
+        master.protocol("WM_DELETE_WINDOW", self.on_close)
+
         self.canvas = Canvas(master, height=canvas_height, width=canvas_width, bg='white')
 
         self.canvas.grid(row = 0, columnspan = 5) #pack(fill=tk.BOTH, expand=True)
@@ -154,6 +369,7 @@ class TestGameGui:
         status_output_frame.grid(row = 2, columnspan = 5,sticky = N)
 
         self.status = None
+        self._status_texts : Dict[Tuple[int, int, str], str] = {} # (status, player index, agent name) -> status text
 
         self.status_text = StringVar()
         self.status_label = Label(status_output_frame, textvariable = self.status_text, anchor = CENTER, bg = "lightblue", pady = 3, justify = CENTER, relief = GROOVE)
@@ -197,10 +413,12 @@ class TestGameGui:
         for item in AGENT_NAMES:
             self.agent_listbox.insert(END, item)
         self.agent_listbox.select_set(0) # This only sets focus on the first item.
-        self.agent_listbox.bind('<<ListboxSelect>>', self.on_agent_changed)
-        self.agent_listbox.event_generate("<<ListboxSelect>>")
+        self.agent_listbox.bind('<<ListboxSelect>>', self.on_agent_selected)
 
-        self.current_agent_name = self.get_agent_selection()
+        # The selected names are cached here when the selection changes, rather than asked of the listboxes on every use
+        self.current_agent_name = AGENT_NAMES[0]
+        self.current_agent_caps = AGENT_CAPS[self.current_agent_name]
+        self.search_kind = 0 # kind of the agent last built by run_search (see AGENT_FACTORIES)
 
 
         self.iterative_deepening_state = IntVar()
@@ -225,9 +443,10 @@ class TestGameGui:
         for item in self.eval_fn_dict.keys():
             self.eval_fn_listbox.insert(END, item)
         self.eval_fn_listbox.select_set(0) # This only sets focus on the first item.
-        self.eval_fn_listbox.event_generate("<<ListboxSelect>>")
+        self.eval_fn_listbox.bind('<<ListboxSelect>>', self.on_eval_fn_changed)
 
-        self.current_eval_fn_name = self.get_eval_fn_selection()
+        self.current_eval_fn_name = next(iter(self.eval_fn_dict))
+        self.current_eval_fn = self.eval_fn_dict[self.current_eval_fn_name]
 
         self.print_state_eval_button = Button(eval_fn_frame, text="Print State Eval", #Print Expected Path
                             command=self.print_eval_display_state,width = 15, pady = 3)
@@ -246,8 +465,7 @@ class TestGameGui:
         self.depth_limit_plateau_cutoff_spinbox = Spinbox(cutoff_frame,
             values=CUTOFF_OPTIONS, width = 5, wrap = True)
         self.depth_limit_plateau_cutoff_spinbox.grid(row= 0, column = 1, sticky = NW, padx = 5)
-        while(self.depth_limit_plateau_cutoff_spinbox.get() != "INF") :
-            self.depth_limit_plateau_cutoff_spinbox.invoke('buttonup')
+        set_spinbox(self.depth_limit_plateau_cutoff_spinbox, "INF")
 
         self.recent_plateau = "INF"
         self.recent_depth_limit = "INF"
@@ -259,9 +477,14 @@ class TestGameGui:
         self.time_limit_spinbox = Spinbox(cutoff_frame,
             values=CUTOFF_OPTIONS, width = 5, wrap = True)
         self.time_limit_spinbox.grid(row= 1, column = 1, sticky = NW, padx = 5)
-        while(self.time_limit_spinbox.get() != "INF") :
-            self.time_limit_spinbox.invoke('buttonup')
+        set_spinbox(self.time_limit_spinbox, "INF")
 
+        # Best moves found by move-ordering agents, kept across searches until the game restarts
+        self.transposition_table : Dict[Hashable, Action] = {}
+        self.keep_tt_state = IntVar()
+        self.keep_tt_state.set(0)
+        self.keep_tt_checkbox = Checkbutton(search_options_frame, text='Keep Transposition Table', variable=self.keep_tt_state)
+        self.keep_tt_checkbox.grid(row = 1, sticky = NW)
 
         exploration_bias_frame = Frame(search_options_frame)
         exploration_bias_frame.grid(row = 3, sticky = NW, pady = 3)
@@ -322,11 +545,13 @@ class TestGameGui:
         self.step_time_label = Label(step_time_spinbox_frame, text = "Step time: ")
         self.step_time_label.grid(row= 0, column = 0, sticky = NW)
 
-        self.step_time_spinbox = Spinbox(step_time_spinbox_frame,
+        # Mirror the spinbox into a float as it changes, rather than parsing its text on every search step
+        self.step_time_var = DoubleVar(value = 0.1)
+        self.step_time_var.trace_add('write', self.on_step_time_changed)
+        self.step_time_spinbox = Spinbox(step_time_spinbox_frame, textvariable = self.step_time_var,
         values=STEP_TIME_OPTIONS, format="%3.2f", width = 4)
         self.step_time_spinbox.grid(row= 0, column = 1, sticky = NW)
-        while self.step_time_spinbox.get() != "0.1" :
-            self.step_time_spinbox.invoke('buttonup')
+        set_spinbox(self.step_time_spinbox, "0.1")
 
         Label(status_output_settings_frame, text = "Post-Search Console Print: ").grid(row= 4, column = 0, sticky = NW)
 
@@ -356,160 +581,39 @@ class TestGameGui:
 
         assert newstatus in VALID_STATUS_TRANSITIONS[self.status]
 
-        self.status = newstatus
+        with self._status_changed:
+            self.status = newstatus
+            self._status_changed.notify_all()
         
-        self.status_text.set(STATUS_TEXT[self.status].format(self.current_state.current_player_index, 
-                                                        self.current_state.player_names[self.current_state.current_player_index],
-                                                        self.current_agent_name))
-        if newstatus == INITIAL_WAITING :
-            self.restart_button['state'] = NORMAL
-            self.restart_button['bg'] = 'orange red'
-            self.undo_move_button['state'] = NORMAL
-            self.undo_move_button['bg'] = 'DodgerBlue2'
-            self.history_button['state'] = NORMAL
-            self.history_button['bg'] = 'orchid1'
-
-            self.reset_button['state'] = DISABLED
-            self.reset_button['text'] = 'Terminate Search'
-            self.reset_button['bg'] = 'grey'
-
-            # Can choose new algorithm settings
-            self.depth_limit_plateau_cutoff_spinbox['state'] = NORMAL
-            self.time_limit_spinbox['state'] = NORMAL
+        self.status_text.set(self.status_message(newstatus))
+        # One configure call per widget, with every option it takes in this status
+        for widget_name, options in STATUS_UI_TABLE[newstatus].items():
+            getattr(self, widget_name).configure(**options)
 
-            self.agent_listbox['state'] = NORMAL
-            self.eval_fn_listbox['state'] = NORMAL
-            self.iterative_deepening_checkbox['state'] = NORMAL
-            self.exploration_bias_label['state'] = NORMAL
-            self.exploration_bias_label_2['state'] = NORMAL
-            self.exploration_bias_entry['state'] = NORMAL
+        # Options that depend on more than the status
+        if newstatus == INITIAL_WAITING :
             self.on_agent_changed() # set certain UI features based on alg
-
-            self.run_pause_button['state'] = NORMAL
-            self.run_pause_button['text'] = 'Start Search'
-            self.run_pause_button['bg'] = 'green'
-
-            self.step_button['state'] = NORMAL
-            self.step_button['text'] = 'Step Search'
-            self.step_button['bg'] = 'yellow'
-
-            self.print_path_states_button['state'] = DISABLED
-            self.print_path_states_button['text'] = "Print Current Search Path"
-
-            self.fly_blind_search_button['state'] = NORMAL
-            self.fly_blind_search_button['bg'] = 'VioletRed1'
-
-
-        elif newstatus in (SEARCHING_RUNNING,
-                            SEARCHING_PAUSED, SEARCHING_STEP):
-            self.restart_button['state'] = DISABLED
-            self.restart_button['bg'] = 'grey'
-            self.undo_move_button['state'] = DISABLED
-            self.undo_move_button['bg'] = 'grey'
-            self.history_button['state'] = DISABLED
-            self.history_button['bg'] = 'grey'
-
-            self.reset_button['state'] = NORMAL
-            self.reset_button['text'] = 'Terminate Search'
-            self.reset_button['bg'] = 'red'
-
-            # Cannot choose new algorithm settings
-            self.depth_limit_plateau_cutoff_spinbox['state'] = DISABLED
-            self.time_limit_spinbox['state'] = DISABLED
-
-            self.agent_listbox['state'] = DISABLED
-            self.eval_fn_listbox['state'] = DISABLED
-            self.iterative_deepening_checkbox['state'] = DISABLED
-            self.exploration_bias_label['state'] = DISABLED
-            self.exploration_bias_label_2['state'] = DISABLED
-            self.exploration_bias_entry['state'] = DISABLED
-
-            self.step_button['state'] = NORMAL
-            self.run_pause_button['state'] = NORMAL
-
-            self.print_path_states_button['state'] = NORMAL
-            self.print_path_states_button['text'] = "Print Current Search Path"
-
-            if newstatus == SEARCHING_RUNNING:
-                self.run_pause_button['text'] = 'Pause Search'
-                self.run_pause_button['bg'] = 'orange'
-            elif newstatus == SEARCHING_PAUSED: # moving away == starting searching
-                self.run_pause_button['text'] = 'Continue Search'
-                self.run_pause_button['bg'] = 'green'
-            elif newstatus == SEARCHING_STEP: # moving away == starting searching
-                self.run_pause_button['text'] = 'Continue Search'
-                self.run_pause_button['bg'] = 'green'
-                # If we're stepping, obviously user means to see things
-                self.visualize_callbacks_state.set(1)
-                self.print_status_state.set(1)
-
-            self.fly_blind_search_button['state'] = DISABLED
-            self.fly_blind_search_button['bg'] = 'grey'
-
-        elif newstatus in (TERMINATING_EARLY,):
-            self.reset_button['state'] = DISABLED
-            self.run_pause_button['state'] = DISABLED
-            self.step_button['state'] = DISABLED
-            self.print_path_states_button['state'] = DISABLED
-
-        elif newstatus in (FINISHED_COMPLETE,):
-            self.reset_button['state'] = NORMAL
-            self.reset_button['text'] = 'Discard Search'
-            self.reset_button['bg'] = 'red'
-
-            self.run_pause_button['state'] = NORMAL
-            self.run_pause_button['text'] = 'Play Best Move'
-            self.run_pause_button['bg'] = 'green'
-
+        elif newstatus == SEARCHING_STEP:
+            # If we're stepping, obviously user means to see things
+            self.visualize_callbacks_state.set(1)
+            self.print_status_state.set(1)
+        elif newstatus == FINISHED_COMPLETE:
             if self.search_result_best_leaf_state != None:
-                self.step_button['state'] = NORMAL
-                self.step_button['text'] = 'Show Expected Path'
-                self.step_button['bg'] = 'violet'
+                self.step_button.configure(state = NORMAL, bg = 'violet')
             else:
-                self.step_button['state'] = DISABLED
-                self.step_button['text'] = 'Show Expected Path'
-                self.step_button['bg'] = 'grey'
-
-            self.print_path_states_button['state'] = NORMAL
-            self.print_path_states_button['text'] = "Print Expected Path"
-
-        elif newstatus in (FINISHED_COMPLETE_DISP_LEAF,):
-            self.step_button['state'] = NORMAL
-            self.step_button['text'] = 'Show Best Move'
-
-        elif newstatus in (FINISHED_NO_RESULT,) :
-            self.reset_button['state'] = NORMAL
-            self.reset_button['text'] = 'Discard Search'
-
-            self.run_pause_button['state'] = DISABLED
-            self.run_pause_button['text'] = 'Play Best Move'
-            self.run_pause_button['bg'] = 'grey'
-
-            self.step_button['state'] = DISABLED
-            self.step_button['text'] = 'Show Expected Path'
-            self.run_pause_button['bg'] = 'grey'
-
-            self.print_path_states_button['state'] = DISABLED
-            self.print_path_states_button['text'] = "Print Expected Path"
-        elif newstatus in (SEARCH_ERROR,):
-            self.restart_button['state'] = DISABLED
-            self.undo_move_button['state'] = DISABLED
-            self.history_button['state'] = DISABLED
-            self.reset_button['state'] = DISABLED
-            # Cannot choose new algorithm settings
-            self.depth_limit_plateau_cutoff_spinbox['state'] = DISABLED
-            self.time_limit_spinbox['state'] = DISABLED
-            self.agent_listbox['state'] = DISABLED
-            self.eval_fn_listbox['state'] = DISABLED
-            self.iterative_deepening_checkbox['state'] = DISABLED
-
-            self.run_pause_button['state'] = DISABLED
-            self.step_button['state'] = DISABLED
-            self.print_path_states_button['state'] = DISABLED
-            self.fly_blind_search_button['state'] = DISABLED
+                self.step_button.configure(state = DISABLED, bg = 'grey')
 
         return newstatus
 
+    def status_message(self, status) -> str:
+        """ The status text for the current player and agent, formatted once per combination """
+        key = (status, self.current_state.current_player_index, self.current_agent_name)
+        if (text := self._status_texts.get(key)) is None:
+            text = self._status_texts[key] = STATUS_TEXT[status].format(self.current_state.current_player_index, 
+                                                        self.current_state.player_names[self.current_state.current_player_index],
+                                                        self.current_agent_name)
+        return text
+
     def print_path_states(self) :
 
         if self.status in (FINISHED_COMPLETE,  FINISHED_COMPLETE_DISP_LEAF):
@@ -523,13 +627,17 @@ class TestGameGui:
             print("No path to print.")
             return
 
-        print(print_str.format(print_state.depth))
+        # Build the whole path and print it in one write, rather than one print per state and action
+        buf = StringIO()
+        print(print_str.format(print_state.depth), file = buf)
         for n, state in enumerate(print_state.get_path()):
             if n > 0:
-                print('P{} [{}] chooses {}'.format(str(n), state.parent.current_player_index,
+                print('P{} [{}] chooses {}'.format(state.parent.current_player_index,
                         state.player_names[state.parent.current_player_index],
-                         state.describe_last_action()))
-            print(str(state))
+                         state.describe_last_action()), file = buf)
+            print(str(state), file = buf)
+        sys.stdout.write(buf.getvalue())
+        sys.stdout.flush()
 
 
     # def print_path_actions(self) :
@@ -539,16 +647,29 @@ class TestGameGui:
     #         if n > 0:
     #             print('{}: {}'.format(str(n), state.describe_previous_action()))
 
+    def on_agent_selected(self, event = None):
+        if selection := self.agent_listbox.curselection():
+            self.current_agent_name = self.agent_listbox.get(selection[0])
+            self.current_agent_caps = AGENT_CAPS[self.current_agent_name]
+        self.on_agent_changed()
+
+    def on_eval_fn_changed(self, event = None):
+        if selection := self.eval_fn_listbox.curselection():
+            self.current_eval_fn_name = self.eval_fn_listbox.get(selection[0])
+            self.current_eval_fn = self.eval_fn_dict[self.current_eval_fn_name]
+
     def on_agent_changed(self, event = None):
-        agent = self.get_agent_selection()
+        caps = self.current_agent_caps
         id = self.iterative_deepening_state.get()
 
-        if agent in ITERATIVE_SEARCH_AGENTS :
+        if caps & CAP_ITER :
             self.iterative_deepening_checkbox['state'] = NORMAL
         else :
             self.iterative_deepening_checkbox['state'] = DISABLED
 
-        if agent in ITERATIVE_SEARCH_AGENTS and id:
+        self.keep_tt_checkbox['state'] = NORMAL if caps & CAP_SEARCH else DISABLED
+
+        if caps & CAP_ITER and id:
             self.time_limit_label['state'] = NORMAL
             self.time_limit_spinbox['state'] = NORMAL
 
@@ -556,8 +677,7 @@ class TestGameGui:
                 self.recent_depth_limit = self.depth_limit_plateau_cutoff_spinbox.get()
                 self.depth_limit_plateau_cutoff_label['text'] = "Plateau Cutoff:"
 
-                while(self.depth_limit_plateau_cutoff_spinbox.get() != self.recent_plateau) :
-                    self.depth_limit_plateau_cutoff_spinbox.invoke('buttonup')
+                set_spinbox(self.depth_limit_plateau_cutoff_spinbox, self.recent_plateau)
         else:
             self.time_limit_label['state'] = DISABLED
             self.time_limit_spinbox['state'] = DISABLED
@@ -565,10 +685,9 @@ class TestGameGui:
                 self.recent_plateau = self.depth_limit_plateau_cutoff_spinbox.get()
                 self.depth_limit_plateau_cutoff_label['text'] = "Depth Limit:"
 
-                while(self.depth_limit_plateau_cutoff_spinbox.get() != self.recent_depth_limit) :
-                    self.depth_limit_plateau_cutoff_spinbox.invoke('buttonup')
+                set_spinbox(self.depth_limit_plateau_cutoff_spinbox, self.recent_depth_limit)
 
-        if agent in ASSYMETRIC_AGENTS:
+        if caps & CAP_ASYM:
             self.time_limit_label['state'] = NORMAL
             self.time_limit_spinbox['state'] = NORMAL
             self.depth_limit_plateau_cutoff_label['state'] = DISABLED
@@ -590,15 +709,14 @@ class TestGameGui:
             self.eval_fn_listbox['state'] = NORMAL
 
     def get_agent_selection(self) :
-        return self.agent_listbox.get(self.agent_listbox.curselection()[0])
+        return self.current_agent_name
          
 
     def get_eval_fn_selection(self) :
-        return self.eval_fn_listbox.get(self.eval_fn_listbox.curselection()[0])
+        return self.current_eval_fn_name
 
     def print_eval_display_state(self):
-        fn_name = self.get_eval_fn_selection()
-        eval_fn = self.eval_fn_dict[self.get_eval_fn_selection()]
+        fn_name, eval_fn = self.current_eval_fn_name, self.current_eval_fn
         print("Evaluation function {} on this state: \n{}\n".format(fn_name, self.display_state))
         cpi = self.display_state.current_player_index
         for i, p in enumerate(self.display_state.player_names):
@@ -609,101 +727,59 @@ class TestGameGui:
 
 
     def verify_parameters(self, fly_blind):
-        if self.current_agent_name  in SEARCH_AGENTS:
-            try:
-                if (cutoff := self.depth_limit_plateau_cutoff_spinbox.get()) != 'INF':
-                    cutoff = int(cutoff)
-            except Exception:
-                self.update_status_and_ui(INITIAL_WAITING)
-                self.status_text.set("Cutoff not a valid int or INF. ('INF' for no limit)")
-                return False
-        if (self.iterative_deepening_state.get() and self.current_agent_name in ITERATIVE_SEARCH_AGENTS) or self.current_agent_name in ASSYMETRIC_AGENTS:
-            try:
-                time_limit = float(self.time_limit_spinbox.get())
-                if fly_blind and (time_limit == INF) :
-                    self.update_status_and_ui(INITIAL_WAITING)
-                    self.status_text.set("Woah there - don't \"fly blind\" with no time limit!")
-                    return False
-            except Exception:
-                self.update_status_and_ui(INITIAL_WAITING)
-                self.status_text.set("Time Limit not a valid number. ('INF' for no limit)")
-                return False
-
-        if self.current_agent_name in ASSYMETRIC_AGENTS:
-            try:
-                exploration_bias = self.exploration_bias_state.get()
-            except Exception:
-                self.update_status_and_ui(INITIAL_WAITING)
-                self.status_text.set("Exploration Bias is not a valid number. (Default 1000)")
-                return False
-
+        """ Parse the search settings the current agent uses into self.search_params, reading each widget once.
+        If any is invalid, says so in the status bar and returns False """
+        caps = self.current_agent_caps
+        id_verbose = self.id_verbose_print_state.get()
+        self.search_params = params = {'iterative_deepening' : bool(self.iterative_deepening_state.get()),
+                                        'verbose' : self.verbose_print_state.get(),
+                                        'super_verbose' : id_verbose,
+                                        'super_super_verbose' : id_verbose,
+                                        'keep_tt' : bool(self.keep_tt_state.get())}
+        error = None
+        if caps & CAP_SEARCH:
+            cutoff = params['depth_limit'] = params['plateau_cutoff'] = parse_number(self.depth_limit_plateau_cutoff_spinbox.get(), int)
+            if cutoff is None:
+                error = "Cutoff not a valid int or INF. ('INF' for no limit)"
+        if error is None and ((params['iterative_deepening'] and caps & CAP_ITER) or caps & CAP_ASYM):
+            time_limit = params['time_limit'] = parse_number(self.time_limit_spinbox.get())
+            if time_limit is None:
+                error = "Time Limit not a valid number. ('INF' for no limit)"
+            elif fly_blind and (time_limit == INF) :
+                error = "Woah there - don't \"fly blind\" with no time limit!"
+        if error is None and caps & CAP_ASYM:
+            # Read the entry's text, since the DoubleVar's get() raises for anything that isn't a number
+            bias = params['exploration_bias'] = parse_number(self.exploration_bias_entry.get())
+            if bias is None:
+                error = "Exploration Bias is not a valid number. (Default 1000)"
+
+        if error is not None:
+            self.update_status_and_ui(INITIAL_WAITING)
+            self.status_text.set(error)
+            return False
         return True
 
 
     def run_search(self, fly_blind):
-        #run?
-
-        id = self.iterative_deepening_state.get()
-        eval_fn = self.eval_fn_dict[self.current_eval_fn_name]
-
-        player_index = self.search_root_state.current_player_index
-
-        depth_limit_plateau_cutoff = int(dlpc) if (dlpc := self.depth_limit_plateau_cutoff_spinbox.get()) != 'INF' else float(dlpc)
-
-        time_limit = float(self.time_limit_spinbox.get())
-        exploration_bias = float(self.exploration_bias_state.get())
-
-        verbose = self.verbose_print_state.get()
-        id_verbose = self.id_verbose_print_state.get()
-
-        show_thinking = True
-
-
-        if self.current_agent_name in ASSYMETRIC_AGENTS:
-            self.current_agent = ASSYMMETRIC_AGENTS[self.current_agent_name](
-                                    player_index = player_index,
-                                    exploration_bias = exploration_bias,
-                                    time_limit = time_limit,
-                                    show_thinking = show_thinking,
-                                    plateau_cutoff = depth_limit_plateau_cutoff,
-                                    verbose = verbose,
-                                    name = self.current_agent_name,
-                                    )
-
-        elif (id and self.current_agent_name in ITERATIVE_SEARCH_AGENTS):
-            self.current_agent = ITERATIVE_SEARCH_AGENTS[self.current_agent_name](
-                                    player_index = player_index,
-                                    evaluation_fn = eval_fn,
-                                    time_limit = time_limit,
-                                    show_thinking = show_thinking,
-                                    plateau_cutoff = depth_limit_plateau_cutoff,
-                                    verbose = verbose,
-                                    super_verbose = id_verbose,
-                                    super_super_verbose = id_verbose,
-                                    name = "ID " + self.current_agent_name,
-                                    )
-        elif self.current_agent_name in SEARCH_AGENTS:
-            self.current_agent = SEARCH_AGENTS[self.current_agent_name](
-                                    player_index = player_index,
-                                    evaluation_fn = eval_fn,
-                                    depth_limit = depth_limit_plateau_cutoff,
-                                    verbose = verbose,
-                                    show_thinking = show_thinking,
-                                    name = self.current_agent_name
-                                    )
-        elif self.current_agent_name in BASIC_AGENTS:
-            self.current_agent = BASIC_AGENTS[self.current_agent_name](
-                                    player_index = player_index,
-                                    evaluation_fn = eval_fn,
-                                    verbose = verbose,
-                                    name = self.current_agent_name
-                                    )
-
-        else: 
-            print("Something went wrong... Yell at Mr. Wang")
+        caps = self.current_agent_caps
+        search_caps = caps if self.search_params['iterative_deepening'] else caps & ~CAP_ITER
+        self.search_kind = next((cap for cap in (CAP_ASYM, CAP_ITER, CAP_SEARCH) if search_caps & cap), 0)
+        agents, param_names, name_prefix = AGENT_FACTORIES[self.search_kind]
+
+        params = {**self.search_params,
+                    'player_index' : self.search_root_state.current_player_index,
+                    'evaluation_fn' : self.current_eval_fn,
+                    'show_thinking' : True,
+                    # Only move-ordering agents use it; the others ignore it
+                    't_table' : self.transposition_table if self.search_params['keep_tt'] else None,
+                    }
+        self.current_agent = agents[self.current_agent_name](name = name_prefix + self.current_agent_name,
+                                                            **{param : params[param] for param in param_names})
 
         self.current_agent.setup_agent(self.alg_callback_blind if fly_blind  else self.alg_callback )
-        result = self.current_agent.choose_action(self.search_root_state)
+        self._callback_step = None
+        self._step_taken = False
+        result = self.search_on_worker(self.current_agent.choose_action, self.search_root_state)
 
         if result == None:
             self.search_result_best_action , self.search_result_best_exp_util, self.search_result_best_leaf_state  = None, None, None
@@ -713,10 +789,58 @@ class TestGameGui:
             self.update_status_and_ui(FINISHED_COMPLETE)
 
 
-    def start_search(self, event = None, initial_status = SEARCHING_RUNNING, fly_blind = False):
-        self.current_agent_name = self.get_agent_selection()
-        self.current_eval_fn_name = self.get_eval_fn_selection()
+    def search_on_worker(self, search : Callable, *args):
+        """ Run search(*args) on the worker thread, keeping the GUI responsive and painting its progress until it returns. 
+        Console output during the search is collected, and written out in one go per repaint.
+        Re-raises any exception from the search (after writing out the output before it). """
+        stdout, output = sys.stdout, self._search_output
+        try:
+            with redirect_stdout(output):
+                future = run_on_daemon_thread(search, *args)
+                while not future.done():
+                    self.paint_callback_step()
+                    self.update_window()
+                    output.write_to(stdout)
+                    time.sleep(CALLBACK_PAINT_INTERVAL)
+        finally:
+            output.write_to(stdout)
+        return future.result()
+
+    def update_window(self):
+        """ Process pending window events. If that closed the window, exit from here rather than carry on with a dead window:
+        SystemExit isn't caught as an error on the way out, and ends mainloop too. """
+        self.master.update()
+        if self._closed:
+            raise SystemExit
+
+    def on_close(self):
+        """ Window closed: stop any search, waking the worker if it is paused or stepping, then close the window """
+        self._closed = True
+        with self._status_changed:
+            self.status = TERMINATING_EARLY
+            self._status_changed.notify_all()
+        self.master.destroy()
+
+    def paint_callback_step(self):
+        """ Show the latest search step posted by alg_callback, if any, then pause if that was a single step """
+        if (step := self._callback_step) is not None:
+            self._callback_step = None
+            state, cur_value, message = step
+
+            if self.print_status_state.get():
+                self.update_text(cur_value, message)
+            if self.visualize_callbacks_state.get() :
+                self.visualize_state(state)
+
+        if self._step_taken:
+            # Pause before releasing the worker, so it waits in alg_callback rather than running on
+            if self.status == SEARCHING_STEP:
+                self.update_status_and_ui(SEARCHING_PAUSED)
+            with self._status_changed:
+                self._step_taken = False
+                self._status_changed.notify_all()
 
+    def start_search(self, event = None, initial_status = SEARCHING_RUNNING, fly_blind = False):
         self.update_status_and_ui(initial_status)
         if not self.verify_parameters(fly_blind):
             return
@@ -734,6 +858,7 @@ class TestGameGui:
 
     def restart_game(self, event = None) :
         if self.status in (INITIAL_WAITING,):
+            self.transposition_table.clear()
             self.current_state = self.initial_state
             self.visualize_state(self.current_state.get_as_root_node())
             self.update_status_and_ui(INITIAL_WAITING)
@@ -794,31 +919,32 @@ class TestGameGui:
                 self.visualize_state(self.current_state.get_as_root_node())
                 self.update_status_and_ui(INITIAL_WAITING)
 
+    def on_step_time_changed(self, *args):
+        try:
+            self.step_time = self.step_time_var.get()
+        except TclError: # not a number (yet); keep the last valid step time
+            pass
+
     def alg_callback(self, state, cur_value, message=None):
-        self.run_pause_button.update()
-        self.step_button.update()
-        self.reset_button.update()
-        self.visualize_callbacks_checkbox.update()
-        self.print_status_checkbox.update()
-
-        if self.print_status_state.get():
-            self.update_text(cur_value, message)
-        if self.visualize_callbacks_state.get() :
-            self.visualize_state(state)
-
-        while self.status == SEARCHING_PAUSED :
-            time.sleep(.1)
-            self.run_pause_button.update()
-            self.step_button.update()
-            self.reset_button.update()
-            self.print_path_states_button.update()
-
-
-        if self.status == SEARCHING_STEP:
-            self.update_status_and_ui(SEARCHING_PAUSED)
+        # Called from the search (worker) thread: no Tk calls here, just post the step for the main thread to paint.
+        # The main thread only paints the latest step once per CALLBACK_PAINT_INTERVAL, however often this is called.
+        self._callback_step = (state, cur_value, message)
+
+        if self.status == SEARCHING_RUNNING and not self.step_time:
+            # Nothing to wait for: carry on without taking the lock
+            return False
+
+        with self._status_changed:
+            if self.status == SEARCHING_STEP:
+                # Hand the pause over to the main thread, and wait until it has taken effect
+                self._step_taken = True
+                self._status_changed.wait_for(lambda : not (self._step_taken and self.status == SEARCHING_STEP))
 
-        if self.status == SEARCHING_RUNNING :
-            time.sleep(float(self.step_time_spinbox.get()))
+            self._status_changed.wait_for(lambda : self.status != SEARCHING_PAUSED)
+
+            if self.status == SEARCHING_RUNNING and self.step_time:
+                # Wait out the step time, unless the search is paused, stepped or stopped meanwhile
+                self._status_changed.wait_for(lambda : self.status != SEARCHING_RUNNING, timeout = self.step_time)
 
         return (self.status == TERMINATING_EARLY)
 
@@ -838,14 +964,8 @@ class TestGameGui:
             self.callback_msg_text.set('')
 
 
-        if type((a := self.current_agent)) in ITERATIVE_SEARCH_AGENTS.values():
-            self.counter_text_1.set('This search || Max Depth: {} | Nodes seen: {} | Leaf evals: {}'.format(a.agent.depth_limit, a.agent.total_nodes, a.agent.total_evals))
-        elif type(a) in ASSYMETRIC_AGENTS.values():
-            self.counter_text_1.set('This search || Rollouts performed: {}'.format(a.agent.total_rollouts))
-        elif type(self.current_agent) in SEARCH_AGENTS.values():
-            self.counter_text_1.set('This search || Nodes seen: {} | Leaf evals: {}'.format(a.agent.total_nodes, a.agent.total_evals))
-        else:
-            self.counter_text_1.set("")
+        counters = COUNTER_FORMATS[self.search_kind]
+        self.counter_text_1.set(counters.format(self.current_agent.agent) if counters else "")
 
 
     def toggle_display_history(self):
@@ -857,8 +977,13 @@ class TestGameGui:
 
     def visualize_state(self, state):
         self.display_state = state
+        # The picture depends on both states (e.g. Roomba's cleaned cells come from the current state).
+        # Resizes redraw through <Configure> themselves, so the last drawing stays valid until either changes.
+        if self.drawn_states is not None and self.drawn_states[0] is state and self.drawn_states[1] is self.current_state:
+            return
         self.draw_path_to_state()
-        self.canvas.update()
+        self.drawn_states = (state, self.current_state)
+        self.update_window()
 
     def click_canvas_attempt_action(self, event = None):
         if self.status == INITIAL_WAITING:
@@ -866,10 +991,129 @@ class TestGameGui:
             if action in self.current_state.get_all_actions():
                 self.current_state = self.current_state.get_next_state(action)
                 self.visualize_state(self.current_state.get_as_root_node())
-        self.status_text.set(STATUS_TEXT[INITIAL_WAITING].format(self.current_state.current_player_index, 
-                                                        self.current_state.player_names[self.current_state.current_player_index],
-                                                        self.current_agent_name))
+        self.status_text.set(self.status_message(INITIAL_WAITING))
+
+
+    def measure_canvas(self, num_rows : int, num_cols : int) -> Tuple[int, int]:
+        """ Read the canvas size once per resize, and precompute the pixel edges and centers of every row and column """
+        w = self.canvas.winfo_width() # Get current width of canvas
+        h = self.canvas.winfo_height() # Get current height of canvas
+        self.xs = [w * c // num_cols for c in range(num_cols + 1)]
+        self.ys = [h * r // num_rows for r in range(num_rows + 1)]
+        self.center_xs = [int(w * (c + .5)) // num_cols for c in range(num_cols)]
+        self.center_ys = [int(h * (r + .5)) // num_rows for r in range(num_rows)]
+        # Kept for mapping clicks back to cells, without asking Tk for the canvas size again
+        self._canvas_size = (w, h)
+        return w, h
+
+    def ensure_measured(self, num_rows : int, num_cols : int):
+        """ Measure the canvas only if it never has been. Every resize (<Configure>) redraws the background,
+        which remeasures it, so other redraws can keep using the tables without asking Tk for the size again """
+        if self._canvas_size is None:
+            self.measure_canvas(num_rows, num_cols)
+
+    def place_item(self, key : Hashable, create : Callable[..., int], *coords, **options) -> int:
+        """ Move the static canvas item stored under key to coords, creating it with options the first time """
+        if (item := self.static_items.get(key)) is None:
+            item = self.static_items[key] = create(*coords, **options)
+        else:
+            self.canvas.coords(item, *coords)
+        return item
+
+    def draw_grid_lines(self, w, h, **line_options):
+        """ Draw all vertical lines as a single polyline item, and all horizontal lines as another.
+        Each line is retraced back to the edge it started from, so the connecting segments run along the canvas border. """
+        verticals = [coord for x in self.xs[:-1] for coord in (x, 0, x, h, x, 0)]
+        horizontals = [coord for y in self.ys[:-1] for coord in (0, y, w, y, 0, y)]
+        self.place_item('vertical_lines', self.canvas.create_line, *verticals, tag='grid_line', **line_options)
+        self.place_item('horizontal_lines', self.canvas.create_line, *horizontals, tag='grid_line', **line_options)
+
+    def click_to_cell(self, event, num_rows : int, num_cols : int) -> Tuple[int, int]:
+        """ The (row, col) of the cell under a click, using the canvas size from the last measure_canvas.
+        Multiplying before dividing inverts the edge tables (xs[c] = w * c // num_cols) exactly,
+        even when the canvas size isn't a multiple of the cell count """
+        w, h = self._canvas_size
+        return (((event.y + 1) * num_rows - 1) // h, ((event.x + 1) * num_cols - 1) // w)
+
+    def calculate_box_coords(self, r, c):
+        return (self.xs[c], self.ys[r], self.xs[c + 1], self.ys[r + 1])
+
+    def place_cell_items(self):
+        """ For board games (with num_rows, num_cols and margin): create one oval per cell the first time,
+        afterwards just move them to the current cell coordinates """
+        xs, ys, margin, cell_items = self.xs, self.ys, self.margin, self.cell_items
+        script = CanvasScript(self.canvas)
+        for r in range(0,self.num_rows):
+            for c in range(0,self.num_cols):
+                box = (xs[c] + margin, ys[r] + margin, xs[c+1] - margin, ys[r+1] - margin)
+                if (r, c) in cell_items:
+                    script.coords(cell_items[r, c], *box)
+                else:
+                    cell_items[r, c] = self.canvas.create_oval(*box, fill= COLORS[EMPTY], tag='empty')
+                    self.cell_fills[r, c] = COLORS[EMPTY]
+        for number, cell in zip(self.number_items, self.number_cells):
+            if cell is not None:
+                script.coords(number, *self.calculate_center_coords(*cell))
+        script.run()
+
+    def fill_changed_cells(self, state):
+        """ For bitboard games: recolor only the cells whose piece differs from the last drawn state, found by XORing the bitboards.
+        Consecutive redraws usually differ by a piece or two, rather than the whole board. """
+        if self.drawn_bitboards is None:
+            self.fill_cell_items(state)
+        else:
+            changed = 0
+            for old, new in zip(self.drawn_bitboards, state.bitboards):
+                changed |= old ^ new
+            cell_fills, bit_cell = self.cell_fills, self.game_class.bit_cell
+            script = CanvasScript(self.canvas)
+            for bit in bit_indices(changed):
+                r, c = bit_cell(bit)
+                fill = PIECE_FILLS[state.get_piece_at(r, c)]
+                if cell_fills[r, c] != fill:
+                    script.itemconfigure(self.cell_items[r, c], fill = fill)
+                    cell_fills[r, c] = fill
+            script.run()
+        self.drawn_bitboards = state.bitboards
+
+    def fill_cell_items(self, state):
+        """ Color the cell ovals with the pieces of state, only touching the cells whose color changed """
+        if not self.cell_items:
+            self.place_cell_items()
+        get_piece_at, cell_fills = state.get_piece_at, self.cell_fills
+        script = CanvasScript(self.canvas)
+        for r in range(0,self.num_rows):
+            for c in range(0,self.num_cols):
+                piece = get_piece_at(r,c)
+                fill = PIECE_FILLS[piece]
+                if cell_fills[r, c] != fill:
+                    script.itemconfigure(self.cell_items[r, c], fill = fill)
+                    cell_fills[r, c] = fill
+        script.run()
+
+    def number_path_cells(self, cells : Sequence[Tuple[int, int]]):
+        """ For board games: number the cells played along the path 1, 2, ... with one reused text item per move number,
+        only moving, showing or hiding the numbers whose cell changed """
+        number_items, number_cells = self.number_items, self.number_cells
+        script = CanvasScript(self.canvas)
+        for i, cell in enumerate(cells):
+            if i == len(number_items):
+                number_items.append(self.canvas.create_text(self.calculate_center_coords(*cell), fill = COLORS[TEXT], tag = 'numbers',
+                    text = str(i+1), font = self.text_font))
+                number_cells.append(cell)
+            elif number_cells[i] != cell:
+                if number_cells[i] is None:
+                    script.itemconfigure(number_items[i], state = NORMAL)
+                script.coords(number_items[i], *self.calculate_center_coords(*cell))
+                number_cells[i] = cell
+        for i in range(len(cells), len(number_items)):
+            if number_cells[i] is not None:
+                script.itemconfigure(number_items[i], state = HIDDEN)
+                number_cells[i] = None
+        script.run()
 
+    def calculate_center_coords(self, r, c):
+        return (self.center_xs[c], self.center_ys[r])
 
     def draw_path_to_state(self, event = None):
         raise NotImplementedError
@@ -888,88 +1132,145 @@ class RoombaRaceGUI(TestGameGui):
         self.maze_height = current_state.get_height()
 
         self.text_size = MAX_HEIGHT // (self.maze_height * 2)
-        super().__init__(master, initial_state, canvas_height = MAX_HEIGHT, canvas_width = MAX_HEIGHT * self.maze_width // self.maze_height, eval_fn_dict = all_fn_dicts[RoombaRaceGameState])
 
-    def calculate_box_coords(self, r, c):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        x1 = w * c // self.maze_width
-        y1 = h * r // self.maze_height
-        x2 = w * (c + 1) // self.maze_width
-        y2 = h * (r + 1) // self.maze_height
-        return (x1, y1, x2, y2)
-
-    def calculate_center_coords(self, r, c):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        x = int(w * (c + .5)) // self.maze_width
-        y = int(h * (r + .5)) // self.maze_height
-        return (x, y)
+        # Terrain and grid lines are drawn as a single image; RGB bytes for each terrain type, indexed by its byte code
+        self.terrain_rgb : List[bytes] = [b''] * 256
+        for code in TERRAIN_CODES:
+            self.terrain_rgb[code] = color_rgb(master, TERRAIN_FILLS[code])
+        self.grid_rgb = color_rgb(master, 'black')
+        self.terrain_item : Optional[int] = None
+        self.terrain_img = None
+        self.terrain_img_size = None
+
+        # Cells painted as cleaned into the terrain image, so redraws only repaint the cells that changed
+        self.painted_cleaned : Set[Tuple[int, int]] = set()
+        # Persistent canvas oval and path line per player, moved rather than recreated on every redraw
+        self.agent_items : List[int] = []
+        self.path_lines : List[int] = []
+        # Path to the displayed state and each player's positions along it, extended incrementally between redraws
+        self.path_states : List[RoombaRaceGameState] = []
+        self.path_index : Dict[int, int] = {} # id(state) -> index in path_states
+        self.path_positions : List[List[Coordinate]] = [[] for p in RoombaRaceGameState.player_names]
+        super().__init__(master, initial_state, canvas_height = MAX_HEIGHT, canvas_width = MAX_HEIGHT * self.maze_width // self.maze_height, eval_fn_dict = RoombaRaceGameState.eval_functions)
 
     def draw_path_to_state(self, event = None):
-        self.canvas.delete('path_line')
-        self.canvas.delete('agent')
-        self.canvas.delete('cleaned_terrain')
-
-        path = self.display_state.get_path()
+        self.ensure_measured(self.maze_height, self.maze_width)
 
-        # Draw cleaned terrain
-        maze = self.current_state.get_grid()
+        self.update_path_cache(self.display_state)
 
-        for r in range(0,self.maze_height):
-            for c in range(0,self.maze_width):
-                if maze[r][c] == CLEANED:
-                    x1, y1, x2, y2 = self.calculate_box_coords(r,c)
-                    self.canvas.create_rectangle(x1, y1, x2, y2, fill= COLORS[maze[r][c]], tag='cleaned_terrain')
+        self.paint_cleaned_cells()
 
         for p in range(len(RoombaRaceGameState.player_names)):
             curr_r, curr_c = self.display_state.get_position(p)
             x1, y1, x2, y2 = self.calculate_box_coords(curr_r,curr_c)
-            self.canvas.create_oval(x1, y1, x2, y2, fill= COLORS[AGENT[p]], tag='agent')
-
-            path_rc = [state.get_position(p) for state in path]
-            path_coords = [self.calculate_center_coords(r,c)
-                            for r,c in path_rc]
-            if len(path_coords) > 1:
-                self.canvas.create_line(path_coords, fill = COLORS[PATH[p]], width = 3, tag='path_line', )
+            if p == len(self.agent_items):
+                self.agent_items.append(self.canvas.create_oval(x1, y1, x2, y2, fill= AGENT_FILLS[p], tag='agent'))
+                self.path_lines.append(self.canvas.create_line(0, 0, 0, 0, fill = PATH_FILLS[p], width = 3, tag='path_line', state = HIDDEN))
+            else:
+                self.canvas.coords(self.agent_items[p], x1, y1, x2, y2)
 
+            center_xs, center_ys = self.center_xs, self.center_ys
+            path_coords = [coord for r, c in self.path_positions[p] for coord in (center_xs[c], center_ys[r])]
+            if len(path_coords) > 2:
+                self.canvas.coords(self.path_lines[p], *path_coords)
+                self.canvas.itemconfigure(self.path_lines[p], state = NORMAL)
+            else:
+                self.canvas.itemconfigure(self.path_lines[p], state = HIDDEN)
+
+    def update_path_cache(self, state : RoombaRaceGameState):
+        """ Make path_states/path_positions describe the path to state, only walking back to the
+        nearest state already in the cached path """
+        new_states = []
+        s = state
+        while s is not None and not ((i := self.path_index.get(id(s))) is not None and self.path_states[i] is s):
+            new_states.append(s)
+            s = s.parent
+
+        keep = 0 if s is None else i + 1
+        for dropped in self.path_states[keep:]:
+            del self.path_index[id(dropped)]
+        del self.path_states[keep:]
+        for positions in self.path_positions:
+            del positions[keep:]
+
+        for s in reversed(new_states):
+            self.path_index[id(s)] = len(self.path_states)
+            self.path_states.append(s)
+            for p, positions in enumerate(self.path_positions):
+                positions.append(s.get_position(p))
+
+    def paint_cleaned_cells(self):
+        """ Paint the current state's cleaned cells into the terrain image, and restore cells no longer cleaned
+        (e.g. when showing an earlier state), inside each cell's grid lines """
+        if self.terrain_img is None:
+            return
+        cleaned = set(self.cleaned_cells(self.current_state.get_grid_bytes()))
+        maze = self.initial_state.get_grid_bytes()
+        xs, ys = self.xs, self.ys
+        repaints = [(cell, TERRAIN_FILLS[maze[cell[0] * self.maze_width + cell[1]]]) for cell in self.painted_cleaned - cleaned]
+        repaints += [(cell, TERRAIN_FILLS[ord(CLEANED)]) for cell in cleaned - self.painted_cleaned]
+        for (r, c), color in repaints:
+            if xs[c] + 1 < xs[c+1] and ys[r] + 1 < ys[r+1]:
+                self.terrain_img.put(color, to = (xs[c] + 1, ys[r] + 1, xs[c+1], ys[r+1]))
+        self.painted_cleaned = cleaned
 
     def draw_background(self, event = None):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
+        w, h = self.measure_canvas(self.maze_height, self.maze_width)
 
-        # Clear the background grid and terrain
-        self.canvas.delete('grid_line')
-        self.canvas.delete('terrain_block')
-
-        # Creates all vertical lines
-        for c in range(0, self.maze_width):
-            x = w * c // self.maze_width
-            self.canvas.create_line([(x, 0), (x, h)], tag='grid_line')
-
-        # Creates all horizontal lines
-        for r in range(0, self.maze_height):
-            y = h * r // self.maze_height
-            self.canvas.create_line([(0, y), (w, y)], tag='grid_line')
-
-        # Draw terrain
-        maze = self.initial_state.get_grid()
-        for r in range(0,self.maze_height):
-            for c in range(0,self.maze_width):
-                terrain = maze[r][c]
-                x1, y1, x2, y2 = self.calculate_box_coords(r,c)
-                self.canvas.create_rectangle(x1, y1, x2, y2, fill= COLORS[terrain], tag='terrain_block')
+        # Draw terrain and grid lines as one image, only rebuilt (and its cleaned cells repainted) when the canvas size changes
+        if self.terrain_item is None:
+            self.terrain_item = self.canvas.create_image(0, 0, anchor = NW, tag='terrain_block')
+        if self.terrain_img_size != (w, h):
+            self.terrain_img = PhotoImage(data = self.terrain_ppm(w, h))
+            self.terrain_img_size = (w, h)
+            self.canvas.itemconfigure(self.terrain_item, image = self.terrain_img)
+            self.painted_cleaned = set()
+            self.paint_cleaned_cells()
+
+        self.canvas.tag_lower('terrain_block')
 
     def click_canvas_to_action(self, event):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        col = event.x // (w //  self.maze_width)
-        h = self.canvas.winfo_height() # Get current height of canvas
-        row = event.y // (h //  self.maze_height)
+        row, col = self.click_to_cell(event, self.maze_height, self.maze_width)
         # print('clicked {}'.format(col))
         cur_r, cur_c = self.current_state.get_position(self.current_state.current_player_index)
         dr, dc = row - cur_r, col - cur_c
         return RoombaRaceAction(dr, dc)
 
+    def terrain_ppm(self, w, h) -> bytes:
+        """ Binary PPM image of the initial terrain at the given canvas size (as last measured by measure_canvas),
+        with a grid line along the top and left edge of every cell """
+        maze = self.initial_state.get_grid_bytes()
+        rgb, grid = self.terrain_rgb, self.grid_rgb
+        widths = [self.xs[c+1] - self.xs[c] for c in range(self.maze_width)]
+        ys = self.ys
+        grid_row = grid * w
+        # Few terrain types and at most two cell widths, and mazes repeat rows (e.g. all-wall borders):
+        # build each distinct cell span and pixel row once
+        spans : Dict[Tuple[int, int], bytes] = {}
+        pixel_rows : Dict[bytes, bytes] = {}
+        pixels = bytearray()
+        for r in range(self.maze_height):
+            row = maze[r * self.maze_width : (r+1) * self.maze_width]
+            if (pixel_row := pixel_rows.get(row)) is None:
+                cells = []
+                for cell in zip(row, widths):
+                    if (span := spans.get(cell)) is None:
+                        terrain, width = cell
+                        span = spans[cell] = (grid + rgb[terrain] * width)[:3 * width]
+                    cells.append(span)
+                pixel_row = pixel_rows[row] = b''.join(cells)
+            if ys[r+1] > ys[r]:
+                pixels += grid_row + pixel_row * (ys[r+1] - ys[r] - 1)
+        return ppm_header(w, h) + bytes(pixels)
+
+    def cleaned_cells(self, maze : bytes) -> Iterable[Tuple[int, int]]:
+        """ (row, col) of every CLEANED cell of a flattened maze, found with bytes.find rather than testing each cell """
+        cleaned = CLEANED.encode()
+        i = maze.find(cleaned)
+        while i != -1:
+            yield divmod(i, self.maze_width)
+            i = maze.find(cleaned, i + 1)
+
 class TicTacToeGUI(TestGameGui):
     def __init__(self, master, initial_state):
         master.title("Tic-Tac-Toe Search Visualizer")
@@ -977,81 +1278,43 @@ class TicTacToeGUI(TestGameGui):
         self.num_rows = TicTacToeGameState.num_rows
         self.num_cols = TicTacToeGameState.num_cols
         self.text_size = MAX_HEIGHT // (self.num_rows * 2)
+        self.text_font = ('Times New Roman', self.text_size, 'bold' )
         self.margin = 5
-        super().__init__(master, initial_state, canvas_height = MAX_HEIGHT, canvas_width = MAX_HEIGHT * self.num_cols // self.num_rows , eval_fn_dict = all_fn_dicts[TicTacToeGameState])
 
-    def calculate_box_coords(self, r, c):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        x1 = w * c // self.num_cols
-        y1 = h * r // self.num_rows
-        x2 = w * (c + 1) // self.num_cols
-        y2 = h * (r + 1) // self.num_rows
-        return (x1, y1, x2, y2)
-
-    def calculate_center_coords(self, r, c):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        x = int(w * (c + .5)) // self.num_cols
-        y = int(h * (r + .5)) // self.num_rows
-        return (x, y)
+        # One oval per cell (recolored, not recreated), and the fill last given to each
+        self.cell_items : Dict[Tuple[int, int], int] = {}
+        self.cell_fills : Dict[Tuple[int, int], str] = {}
+        # One text item per move number, and the cell it is shown on (None if hidden)
+        self.number_items : List[int] = []
+        self.number_cells : List[Optional[Tuple[int, int]]] = []
+        # The bitboards of the pieces the cell ovals currently show (None before the first draw)
+        self.drawn_bitboards : Optional[Tuple[int, int]] = None
+        super().__init__(master, initial_state, canvas_height = MAX_HEIGHT, canvas_width = MAX_HEIGHT * self.num_cols // self.num_rows , eval_fn_dict = TicTacToeGameState.eval_functions)
 
     def draw_path_to_state(self, event = None):
-        self.canvas.delete('numbers')
-
-        self.canvas.delete('pieces')
-        self.canvas.delete('numbers')
+        self.ensure_measured(self.num_rows, self.num_cols)
 
         # draw pieces
-        for r in range(0,self.num_rows):
-            for c in range(0,self.num_cols):
-                piece = self.display_state.get_piece_at(r,c)
-                if piece != TicTacToeGameState.EMPTY:
-                    x1, y1, x2, y2 = self.calculate_box_coords(r,c)
-                    self.canvas.create_oval(x1 + self.margin, y1 + self.margin, x2 - self.margin, y2 - self.margin, fill= COLORS[PIECE[piece]], tag='pieces')
+        self.fill_changed_cells(self.display_state)
 
         # draw text for path
-        path_coords = [self.calculate_center_coords( *state.last_action ) # r,c coordinates
-                        for state in self.display_state.get_path()[1:] ]
-
-        for i, pos in enumerate(path_coords): # don't do the first state
-             self.canvas.create_text(pos, fill = COLORS[TEXT], tag = 'numbers',
-                 text = str(i+1), font = ('Times New Roman', self.text_size, 'bold' ))
+        self.number_path_cells([tuple(state.last_action) # r,c coordinates
+                                for state in self.display_state.get_path()[1:]]) # don't do the first state
 
     def draw_background(self, event = None):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        # Clear the background grid frame and empty spots
-        self.canvas.delete('grid_line')
-        self.canvas.delete('frame')
-        self.canvas.delete('empty')
-
+        w, h = self.measure_canvas(self.num_rows, self.num_cols)
         # Draw all the "frame" - really, background color
-        self.canvas.create_rectangle(0, 0, w, h, fill= COLORS[FRAME], tag='frame')
-
-        # Draw all the "empty spots"
-        for r in range(0,self.num_rows):
-            for c in range(0,self.num_cols):
-                piece = self.display_state.get_piece_at(r,c)
-                x1, y1, x2, y2 = self.calculate_box_coords(r,c)
-                self.canvas.create_oval(x1 + self.margin, y1 + self.margin, x2 - self.margin, y2 - self.margin, fill= COLORS[EMPTY], tag='empty')
+        self.place_item('frame', self.canvas.create_rectangle, 0, 0, w, h, fill= COLORS[FRAME], tag='frame')
+        self.canvas.tag_lower('frame')
 
+        # Move all the cells (empty spots and pieces) and path numbers
+        self.place_cell_items()
 
-        # Creates all vertical lines
-        for c in range(0, self.num_cols):
-            x = w * c // self.num_cols
-            self.canvas.create_line([(x, 0), (x, h)], tag='grid_line', width = 2)
-
-        # Creates all horizontal lines
-        for r in range(0, self.num_rows):
-            y = h * r // self.num_rows
-            self.canvas.create_line([(0, y), (w, y)], tag='grid_line', width = 2)
+        # Creates all grid lines, one canvas item per axis
+        self.draw_grid_lines(w, h, width = 2)
 
     def click_canvas_to_action(self, event) -> TicTacToeAction:
-        w = self.canvas.winfo_width() # Get current width of canvas
-        col = event.x // (w //  self.num_cols)
-        h = self.canvas.winfo_height() # Get current height of canvas
-        row = event.y // (h //  self.num_rows)
+        row, col = self.click_to_cell(event, self.num_rows, self.num_cols)
         return TicTacToeAction(row, col)
 
 class NimGUI(TestGameGui):
@@ -1059,74 +1322,87 @@ class NimGUI(TestGameGui):
         master.title("Nim Search Visualizer")
         self.game_class = NimGameState
         self.num_rows = initial_state.get_num_piles()
-        self.num_cols = max(initial_state.get_stones_in_pile(p) for p in range(self.num_rows))
+        self.num_cols = max(initial_state.get_stones_per_pile())
         height = min(MAX_HEIGHT, self.num_rows * 60)
         self.text_size = height // (self.num_rows * 2)
+        self.text_font = ('Times New Roman', self.text_size, 'bold' )
         self.margin = 5
-        super().__init__(master, initial_state, canvas_height = height, canvas_width = height * self.num_cols // self.num_rows ,eval_fn_dict = all_fn_dicts[NimGameState])
 
-    def calculate_box_coords(self, r, c):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        x1 = w * c // self.num_cols
-        y1 = h * r // self.num_rows
-        x2 = w * (c + 1) // self.num_cols
-        y2 = h * (r + 1) // self.num_rows
-        return (x1, y1, x2, y2)
+        # Persistent canvas items: one oval and one number per stone, reconfigured (not recreated) on every redraw
+        self.stone_items : Dict[Tuple[int, int], Tuple[int, int]] = {}
+        self.stone_looks : Dict[Tuple[int, int], Tuple[Optional[str], str]] = {} # (fill or None if hidden, number text)
+        super().__init__(master, initial_state, canvas_height = height, canvas_width = height * self.num_cols // self.num_rows ,eval_fn_dict = NimGameState.eval_functions)
 
-    def calculate_center_coords(self, r, c):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        x = int(w * (c + .5)) // self.num_cols
-        y = int(h * (r + .5)) // self.num_rows
-        return (x, y)
+    def place_stone_items(self):
+        """ Create the stone ovals and numbers (hidden) the first time; afterwards just move them to the current cell coordinates """
+        xs, ys, margin, stone_items = self.xs, self.ys, self.margin, self.stone_items
+        script = CanvasScript(self.canvas)
+        for r in range(0,self.num_rows):
+            for c in range(0,self.initial_state.get_stones_in_pile(r)):
+                box, center = (xs[c] + margin, ys[r] + margin, xs[c+1] - margin, ys[r+1] - margin), self.calculate_center_coords(r,c)
+                if (r, c) in stone_items:
+                    oval, number = stone_items[r, c]
+                    script.coords(oval, *box)
+                    script.coords(number, *center)
+                else:
+                    stone_items[r, c] = (self.canvas.create_oval(*box, fill= COLORS[STONE], state = HIDDEN, tag='pieces'),
+                                        self.canvas.create_text(center, fill = COLORS[TEXT], state = HIDDEN, tag = 'numbers',
+                                            text = '', font = self.text_font))
+                    self.stone_looks[r, c] = (None, '')
+        script.run()
 
     def draw_path_to_state(self, event = None):
-        self.canvas.delete('pieces')
-        self.canvas.delete('numbers')
-        self.canvas.delete('STONE_pieces')
-
-        # draw pieces
+        self.ensure_measured(self.num_rows, self.num_cols)
+        if not self.stone_items:
+            self.place_stone_items()
+
+        # Work out how every stone should look: remaining stones are plain,
+        # stones taken along the path are colored by who took them and numbered by the move
+        looks = dict.fromkeys(self.stone_items, (None, ''))
+        remaining = (COLORS[STONE], '')
         for r in range(0,self.num_rows):
             for c in range(0,self.display_state.get_stones_in_pile(r)):
-                x1, y1, x2, y2 = self.calculate_box_coords(r,c)
-                self.canvas.create_oval(x1 + self.margin, y1 + self.margin, x2 - self.margin, y2 - self.margin, fill= COLORS[STONE], tag='pieces')
+                looks[r, c] = remaining
 
-        # draw text and colored ovals for STONE stones along path
-
-        # for every action taken
+        # for every action taken; the player who took it is the parent's current player,
+        # so the fill indexed by the other player is the one indexed by this state's
         for i, state in enumerate(self.display_state.get_path()[1:]): # don't do the first state
-            rem_stones, pile = state.last_action
-            orig_stones = state.parent.get_stones_in_pile(pile)
-            player = state.parent.current_player_index
-            # draw over each stone
-            for c in range(orig_stones - rem_stones, orig_stones):
-                pos = self.calculate_center_coords(pile,c)
-                x1, y1, x2, y2 = self.calculate_box_coords(pile,c)
-
-                self.canvas.create_oval(x1 + self.margin, y1 + self.margin, x2 - self.margin, y2 - self.margin, fill= COLORS[PIECE[0] if player == 1 else PIECE[1]], tag='STONE_pieces')
-
-                self.canvas.create_text(pos, fill = COLORS[TEXT], tag = 'numbers',
-                     text = str(i+1), font = ('Times New Roman', self.text_size, 'bold' ))
+            look = (PIECE_FILLS[state.current_player_index], str(i+1))
+            pile = state.last_action.pile
+            for c in state.get_taken_stones():
+                looks[pile, c] = look
+
+        # Reconfigure only the stones whose look changed, all in one script
+        script = CanvasScript(self.canvas)
+        stone_looks, itemconfigure = self.stone_looks, script.itemconfigure
+        for cell, look in looks.items():
+            if stone_looks[cell] != look:
+                fill, text = look
+                oval, number = self.stone_items[cell]
+                if fill is None:
+                    itemconfigure(oval, state = HIDDEN)
+                else:
+                    itemconfigure(oval, fill = fill, state = NORMAL)
+                itemconfigure(number, text = text, state = NORMAL if text else HIDDEN)
+                stone_looks[cell] = look
+        script.run()
 
     def draw_background(self, event = None):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        # Clear the empty spots
-        self.canvas.delete('empty')
+        w, h = self.measure_canvas(self.num_rows, self.num_cols)
         # Draw all the "empty spots"
         for r in range(0,self.num_rows):
             for c in range(0,self.initial_state.get_stones_in_pile(r)):
-                pos = self.calculate_center_coords(r,c)
                 x1, y1, x2, y2 = self.calculate_box_coords(r,c)
-                self.canvas.create_oval(x1 + self.margin, y1 + self.margin, x2 - self.margin, y2 - self.margin,  fill= '', outline = COLORS[STONE], width = 2, dash = (4,4), tag='empty')
+                self.place_item(('empty', r, c), self.canvas.create_oval, x1 + self.margin, y1 + self.margin, x2 - self.margin, y2 - self.margin,
+                                fill= '', outline = COLORS[STONE], width = 2, dash = (4,4), tag='empty')
+        self.canvas.tag_lower('empty')
+
+        # Move all the stones and their numbers
+        self.place_stone_items()
 
 
     def click_canvas_to_action(self, event) -> NimAction:
-        w = self.canvas.winfo_width() # Get current width of canvas
-        col = event.x // (w //  self.num_cols)
-        h = self.canvas.winfo_height() # Get current height of canvas
-        row = event.y // (h //  self.num_rows)
+        row, col = self.click_to_cell(event, self.num_rows, self.num_cols)
         # print('clicked {}'.format(col))
         pile = row
         rem_stones = self.current_state.get_stones_in_pile(pile) - col
@@ -1141,83 +1417,44 @@ class ConnectFourGUI(TestGameGui):
         self.num_rows = ConnectFourGameState.num_rows
         self.num_cols = ConnectFourGameState.num_cols
         self.text_size = MAX_HEIGHT // (self.num_rows * 2)
+        self.text_font = ('Times New Roman', self.text_size, 'bold' )
         self.margin = MAX_HEIGHT // (self.num_rows * 10)
-        super().__init__(master, initial_state, canvas_height = MAX_HEIGHT, canvas_width = MAX_HEIGHT * self.num_cols // self.num_rows, eval_fn_dict = all_fn_dicts[ConnectFourGameState])
 
-    def calculate_box_coords(self, r, c):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        x1 = w * c // self.num_cols
-        y1 = h * r // self.num_rows
-        x2 = w * (c + 1) // self.num_cols
-        y2 = h * (r + 1) // self.num_rows
-        return (x1, y1, x2, y2)
-
-    def calculate_center_coords(self, r, c):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        x = int(w * (c + .5)) // self.num_cols
-        y = int(h * (r + .5)) // self.num_rows
-        return (x, y)
+        # One oval per cell (recolored, not recreated), and the fill last given to each
+        self.cell_items : Dict[Tuple[int, int], int] = {}
+        self.cell_fills : Dict[Tuple[int, int], str] = {}
+        # One text item per move number, and the cell it is shown on (None if hidden)
+        self.number_items : List[int] = []
+        self.number_cells : List[Optional[Tuple[int, int]]] = []
+        # The bitboards of the pieces the cell ovals currently show (None before the first draw)
+        self.drawn_bitboards : Optional[Tuple[int, int]] = None
+        super().__init__(master, initial_state, canvas_height = MAX_HEIGHT, canvas_width = MAX_HEIGHT * self.num_cols // self.num_rows, eval_fn_dict = ConnectFourGameState.eval_functions)
 
     def draw_path_to_state(self, event = None):
-        self.canvas.delete('numbers')
-
-        self.canvas.delete('pieces')
-        self.canvas.delete('numbers')
+        self.ensure_measured(self.num_rows, self.num_cols)
 
         # draw pieces
-        for r in range(0,self.num_rows):
-            for c in range(0,self.num_cols):
-                piece = self.display_state.get_piece_at(r,c)
-                if piece != ConnectFourGameState.EMPTY:
-                    pos = self.calculate_center_coords(r,c)
-                    x1, y1, x2, y2 = self.calculate_box_coords(r,c)
-                    self.canvas.create_oval(x1 + self.margin, y1 + self.margin, x2 - self.margin, y2 - self.margin, fill= COLORS[PIECE[piece]], tag='pieces')
+        self.fill_changed_cells(self.display_state)
 
         # draw text for path
-        path_coords = [self.calculate_center_coords(
-                        self.num_rows -  state.get_column_height(state.last_action.column) ,state.last_action.column ) # r,c coordinates
-                        for state in self.display_state.get_path()[1:] ]
-
-        for i, pos in enumerate(path_coords): # don't do the first state
-             self.canvas.create_text(pos, fill = COLORS[TEXT], tag = 'numbers',
-                 text = str(i+1), font = ('Times New Roman', self.text_size, 'bold' ))
+        self.number_path_cells([(self.num_rows -  state.get_column_height(state.last_action.column), state.last_action.column) # r,c coordinates
+                                for state in self.display_state.get_path()[1:]]) # don't do the first state
 
     def draw_background(self, event = None):
-        w = self.canvas.winfo_width() # Get current width of canvas
-        h = self.canvas.winfo_height() # Get current height of canvas
-        # Clear the background grid frame and empty spots
-        self.canvas.delete('grid_line')
-        self.canvas.delete('frame')
-        self.canvas.delete('empty')
-
+        w, h = self.measure_canvas(self.num_rows, self.num_cols)
         # Draw all the "frame" - really, background color
-        self.canvas.create_rectangle(0, 0, w, h, fill= COLORS[FRAME], tag='frame')
-
-        # Draw all the "empty spots"
-        for r in range(0,self.num_rows):
-            for c in range(0,self.num_cols):
-                piece = self.display_state.get_piece_at(r,c)
-                pos = self.calculate_center_coords(r,c)
-                x1, y1, x2, y2 = self.calculate_box_coords(r,c)
-                self.canvas.create_oval(x1 + self.margin, y1 + self.margin, x2 - self.margin, y2 - self.margin, fill= COLORS[EMPTY], tag='empty')
+        self.place_item('frame', self.canvas.create_rectangle, 0, 0, w, h, fill= COLORS[FRAME], tag='frame')
+        self.canvas.tag_lower('frame')
 
+        # Move all the cells (empty spots and pieces) and path numbers
+        self.place_cell_items()
 
-        # Creates all vertical lines
-        for c in range(0, self.num_cols):
-            x = w * c // self.num_cols
-            self.canvas.create_line([(x, 0), (x, h)], tag='grid_line', width = 2)
-
-        # Creates all horizontal lines
-        for r in range(0, self.num_rows):
-            y = h * r // self.num_rows
-            self.canvas.create_line([(0, y), (w, y)], tag='grid_line', width = 2)
+        # Creates all grid lines, one canvas item per axis
+        self.draw_grid_lines(w, h, width = 2)
 
 
     def click_canvas_to_action(self, event) -> ConnectFourAction:
-        w = self.canvas.winfo_width() # Get current width of canvas
-        col = event.x // (w //  self.num_cols)
+        row, col = self.click_to_cell(event, self.num_rows, self.num_cols)
         return ConnectFourAction(col)
 
 
@@ -1240,7 +1477,7 @@ if (argv[1] not in GAME_CLASSES_AND_GUIS):
 
 
 game_class, GUI = GAME_CLASSES_AND_GUIS[argv[1]]
-eval_fn_dict = all_fn_dicts[game_class]
+eval_fn_dict = game_class.eval_functions
 
 initial_state = game_class.defaultInitialState() if argv[2] == 'default' else game_class.readFromFile(argv[2])
 
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from typing import Optional, Any, Hashable, Sequence, Iterable, NamedTuple, List, Tuple
-from copy import deepcopy
+from functools import lru_cache
 from gamesearch_problem import StateNode, Action
 
 
@@ -48,14 +48,27 @@ class TicTacToeGameState(StateNode):
 
     num_rows = 3  # board height
     num_cols = 3  # board width
+    num_cells = num_rows * num_cols
     
     EMPTY = -1
 
     num_to_symbol = {EMPTY: "_", 0: "X", 1: "0"}
     symbol_to_num = {"_": EMPTY, "X": 0, "0": 1}
 
+    # Bitboards: cell (r, c) is bit r * num_cols + c
+    board_mask : int # every cell of the board
+    win_masks : List[int] # every row, column and diagonal
+    cell_actions : Tuple[TicTacToeAction, ...] # the action playing each cell, indexed by its bit; shared by every state
+
+    # The lines printed under every board: a rule, then the column numbers
+    board_footer : List[str] = ["-" * (num_cols * 2 - 1), "|".join(str(c) for c in range(num_cols))]
+
     """ Instance Variables """
-    board : List[List[int]]
+    board : List[int] # flat, row by row: cell (r, c) is board[r * num_cols + c]
+    bitboards : Tuple[int, int] # the cells of each player's pieces
+    features : int # both bitboards packed into one int, player 1's above player 0's
+
+    __slots__ = ('board', 'bitboards', 'features')
 
     @staticmethod
     def readFromFile(filename):
@@ -66,13 +79,12 @@ class TicTacToeGameState(StateNode):
         Following num_rows lines: num_cols str for pieces or spaces "_" in each row of the board.
         """
         with open(filename, 'r') as file:
-            board = []
-            first_player = int(TicTacToeGameState.player_names.index(file.readline().strip()))
+            lines = file.read().split('\n')
 
-            for i in range(TicTacToeGameState.num_rows):
-                row = [TicTacToeGameState.symbol_to_num[x] for x in file.readline().split()]
-                assert(len(row) == TicTacToeGameState.num_cols)
-                board.append(row)
+        first_player = int(TicTacToeGameState.player_names.index(lines[0].strip()))
+        rows = [line.split() for line in lines[1:TicTacToeGameState.num_rows + 1]]
+        assert(len(rows) == TicTacToeGameState.num_rows and all(len(row) == TicTacToeGameState.num_cols for row in rows))
+        board = [TicTacToeGameState.symbol_to_num[x] for row in rows for x in row]
 
         return TicTacToeGameState(
             board = board,
@@ -89,7 +101,7 @@ class TicTacToeGameState(StateNode):
         The default is an empty board, player index 0 (player number 1, name "Red")
         """
         return TicTacToeGameState(
-            board = [[TicTacToeGameState.EMPTY for c in range(TicTacToeGameState.num_cols)] for r in range(TicTacToeGameState.num_rows)],
+            board = [TicTacToeGameState.EMPTY] * TicTacToeGameState.num_cells,
             parent = None,
             depth = 0,
             last_action = None,
@@ -98,17 +110,21 @@ class TicTacToeGameState(StateNode):
 
    
     def __init__(self, 
-                board : Tuple[int,...],
+                board : List[int],
                 parent : Optional[StateNode], 
                 last_action: Optional[Action], 
                 depth : int, 
-                current_player_index : int):
+                current_player_index : int,
+                bitboards : Optional[Tuple[int, int]] = None):
         """
         Creates a game state node.
         Takes:
 
-        board: a 2-d list (list of lists) representing the board.
-        Numbers are either 0 (no piece), 1 or 2.
+        board: a flat list of the cells, row by row (cell (r, c) is board[r * num_cols + c]).
+        Numbers are either -1 (no piece), or the index of the player's piece.
+
+        bitboards: the same board as one int per player (see TicTacToeGameState.cell_bit).
+                Computed from board if not given.
 
         parent: the preceding TicTacToeGameState along the path taken to reach the state
                 (the initial state's parent should be None)
@@ -119,6 +135,12 @@ class TicTacToeGameState(StateNode):
         Use super().__init__() to call this function in the subclass __init__()
         """
         self.board = board
+        if bitboards is None:
+            # A cell's bit is its index in the flat board
+            bitboards = tuple(sum(1 << i for i, piece in enumerate(board) if piece == player)
+                                for player in range(len(TicTacToeGameState.player_names)))
+        self.bitboards = bitboards
+        self.features = bitboards[0] | bitboards[1] << TicTacToeGameState.num_cells
         super().__init__(parent=parent,
             last_action=last_action,
             depth=depth,
@@ -136,24 +158,21 @@ class TicTacToeGameState(StateNode):
         that is, they may have different parents, last actions, depths etc...
 
         NOTE: In this case,the current player IS implicitly encoded in the features.
+
+        This is a single int (built once, with the state), so hashing and comparing states doesn't touch a tuple.
         """
-        return tuple(tuple(row) for row in self.board)
+        return self.features
 
 
     def __str__(self) -> str:
         """Return a string representation of the state."""
-        ret = ""
-        for row in self.board:
-            ret += "|".join(TicTacToeGameState.num_to_symbol[piece] for piece in row)
-            ret += "\n"
-        for i in range(TicTacToeGameState.num_cols * 2 - 1):
-            ret += "-"
-        ret += "\n"
-        ret += "|".join(str(c) for c in range(TicTacToeGameState.num_cols))
-        ret += "\n"
-        ret += "(P{} [{}]'s turn)\n".format(self.current_player_index, TicTacToeGameState.player_names[self.current_player_index]) 
-
-        return ret
+        num_cols, num_to_symbol = TicTacToeGameState.num_cols, TicTacToeGameState.num_to_symbol
+        lines = ["|".join(num_to_symbol[piece] for piece in self.board[r:r + num_cols])
+                    for r in range(0, len(self.board), num_cols)]
+        lines += TicTacToeGameState.board_footer
+        lines.append("(P{} [{}]'s turn)".format(self.current_player_index, TicTacToeGameState.player_names[self.current_player_index]))
+
+        return "\n".join(lines) + "\n"
 
     def endgame_utility(self, player_index : int) -> Optional[float]:
         """Returns the endgame utility of this state from the perspective of the given player.
@@ -167,44 +186,28 @@ class TicTacToeGameState(StateNode):
         Instead of using this directly, you should incorporate it into an evaluation function.
         The interpretation of this standard utility can be altered by the evaluation function.
         """        
-        for player in range(len(TicTacToeGameState.player_names)):
-        
-            # Horizontal wins
-            for r in range(TicTacToeGameState.num_rows):
-                if all(self.board[r][c] == player for c in range(TicTacToeGameState.num_cols)) :
-                    return 1 if player == player_index else -1
-
-            # Vertical wins
-            for c in range(TicTacToeGameState.num_cols):
-                if all(self.board[r][c] == player for r in range(TicTacToeGameState.num_rows)) :
-                    return 1 if player == player_index else -1
-
-            # Diagonal down-right wins
-            if all(self.board[r][c] == player for r, c in zip(range(TicTacToeGameState.num_rows),range(TicTacToeGameState.num_cols))) :
-                return 1 if player == player_index else -1
-
-            # Diagonal up-right wins
-            if all(self.board[r][c] == player for r, c in zip(reversed(range(TicTacToeGameState.num_rows)),range(TicTacToeGameState.num_cols))) :
-                return 1 if player == player_index else -1
-
-        # If you get here, no winner yet!
-        return 0
+        winner = _winner(self.bitboards)
+        if winner is None: # no winner yet!
+            return 0
+        return 1 if winner == player_index else -1
 
     
 
 
     def is_endgame_state(self) -> bool:
         """Returns whether or not this state is an endgame state (terminal)"""
-        if len(self.get_all_actions()) == 0:
+        bitboards = self.bitboards
+        if bitboards[0] | bitboards[1] == TicTacToeGameState.board_mask:
             return True
-        return self.endgame_utility(0) != 0
+        return _winner(bitboards) is not None
 
     def is_legal_action(self, action : TicTacToeAction) -> bool:
         """Returns whether an action is legal from the current state"""
         if action.col not in range(TicTacToeGameState.num_cols) or action.row not in range(TicTacToeGameState.num_rows) :
             return False
         
-        return self.board[action.row][action.col] == TicTacToeGameState.EMPTY
+        occupied = self.bitboards[0] | self.bitboards[1]
+        return not (occupied >> TicTacToeGameState.cell_bit(action.row, action.col)) & 1
 
 
     def get_all_actions(self) -> Iterable[TicTacToeAction]:
@@ -212,12 +215,8 @@ class TicTacToeGameState(StateNode):
         Return all legal actions from this state. Actions may be whatever type you wish.
         Note that the ordering may matter for the algorithm (e.g. Alpha-Beta pruning).
         """
-        actions = []
-        for row in range(TicTacToeGameState.num_rows):
-            for col in range(TicTacToeGameState.num_cols):
-                if self.get_piece_at(row,col) == TicTacToeGameState.EMPTY:
-                    actions.append(TicTacToeAction(row,col))
-        return actions
+        # A fresh list each time, since callers may reorder it
+        return list(_empty_cell_actions(self.bitboards[0] | self.bitboards[1]))
 
 
     def get_next_state(self, action : TicTacToeAction) -> StateNode:
@@ -227,17 +226,69 @@ class TicTacToeGameState(StateNode):
         -- action is assumed legal (is_legal_action called before), but a ValueError may be passed for illegal actions if desired.
         """
 
-        new_board = deepcopy(self.board)
-        new_board[action.row][action.col] = self.current_player_index
+        # Looked up once, this runs for every node of a search
+        player = self.current_player_index
+        cell = action.row * TicTacToeGameState.num_cols + action.col # cell_bit, inlined
+        new_board = list(self.board)
+        new_board[cell] = player
+
+        new_bitboards = list(self.bitboards)
+        new_bitboards[player] |= 1 << cell
 
         return TicTacToeGameState(board = new_board,
             parent = self,
             depth = self.depth + 1,
             last_action = action,
-            current_player_index = (self.current_player_index + 1) % len(TicTacToeGameState.player_names) )
+            current_player_index = (player + 1) % len(TicTacToeGameState.player_names),
+            bitboards = tuple(new_bitboards) )
 
 
     """ Additional TicTacToe specific methods """
 
     def get_piece_at(self, row, col) -> int:
-        return self.board[row][col]
+        return self.board[row * TicTacToeGameState.num_cols + col]
+
+    @staticmethod
+    def cell_bit(row : int, col : int) -> int:
+        """ The bit of cell (row, col) in a bitboard """
+        return row * TicTacToeGameState.num_cols + col
+
+    @staticmethod
+    def bit_cell(bit : int) -> Tuple[int, int]:
+        """ The (row, col) of a bit in a bitboard; the inverse of cell_bit """
+        return divmod(bit, TicTacToeGameState.num_cols)
+
+# Transpositions reach the same board by different move orders, so these are remembered per board.
+# There are at most 3^9 boards (2^9 for the occupied cells alone), so the caches need no bound.
+
+@lru_cache(maxsize=None)
+def _winner(bitboards : Tuple[int, int]) -> Optional[int]:
+    """ The index of the player with a whole row, column or diagonal, or None """
+    win_masks = TicTacToeGameState.win_masks
+    for player, pieces in enumerate(bitboards):
+        if any(pieces & mask == mask for mask in win_masks):
+            return player
+    return None
+
+@lru_cache(maxsize=None)
+def _empty_cell_actions(occupied : int) -> Tuple[TicTacToeAction, ...]:
+    """ An action for every cell not in occupied, scanning the bits lowest first (so row by row, as the board reads) """
+    cell_actions = TicTacToeGameState.cell_actions
+    empty = TicTacToeGameState.board_mask & ~occupied
+    actions = []
+    while empty:
+        low = empty & -empty
+        actions.append(cell_actions[low.bit_length() - 1])
+        empty ^= low
+    return tuple(actions)
+
+def _line_mask(cells : Iterable[Tuple[int, int]]) -> int:
+    return sum(1 << TicTacToeGameState.cell_bit(r, c) for r, c in cells)
+
+_rows, _cols = range(TicTacToeGameState.num_rows), range(TicTacToeGameState.num_cols)
+TicTacToeGameState.board_mask = _line_mask((r, c) for r in _rows for c in _cols)
+TicTacToeGameState.cell_actions = tuple(TicTacToeAction(r, c) for r in _rows for c in _cols)
+TicTacToeGameState.win_masks = ([_line_mask((r, c) for c in _cols) for r in _rows] # Horizontal wins
+                                + [_line_mask((r, c) for r in _rows) for c in _cols] # Vertical wins
+                                + [_line_mask(zip(_rows, _cols)), # Diagonal down-right win
+                                   _line_mask(zip(reversed(_rows), _cols))]) # Diagonal up-right win